@@ -0,0 +1,44 @@
+"""
+In-process TTL cache for hot balance and transaction reads
+"""
+from typing import Any, Optional
+from cachetools import TTLCache
+from core.config import get_settings
+
+settings = get_settings()
+
+# Reads are grouped under the key that invalidates them:
+#   ("link", merchant_id, user_id) -> ("balance",), ("txns", limit)
+#   ("user", user_id)              -> ("user_txns", limit), ("linked_merchants",)
+# Each group is a single cache entry holding {read_key: value}, so a write drops
+# everything it affects with one pop instead of scanning the cache.
+#
+# The cache is per process. invalidate_link() only clears this worker's copy,
+# so with several workers a read can lag another worker's write by up to
+# READ_CACHE_TTL_SECONDS; keep that TTL to a few seconds.
+_groups: TTLCache = TTLCache(maxsize=10_000, ttl=settings.READ_CACHE_TTL_SECONDS)
+
+
+def get_cached(group: tuple, key: tuple) -> Optional[Any]:
+    """Return a cached read, or None if it isn't cached"""
+    entries = _groups.get(group)
+    return entries.get(key) if entries is not None else None
+
+
+def set_cached(group: tuple, key: tuple, value: Any) -> None:
+    """Cache a read; it expires with the rest of its group"""
+    entries = _groups.get(group)
+    if entries is None:
+        _groups[group] = entries = {}
+    entries[key] = value
+
+
+def invalidate_user(user_id: str) -> None:
+    """Drop the cached reads spanning all of a user's links"""
+    _groups.pop(("user", user_id), None)
+
+
+def invalidate_link(merchant_id: str, user_id: str) -> None:
+    """Drop every cached read that depends on the given merchant-user link"""
+    _groups.pop(("link", merchant_id, user_id), None)
+    invalidate_user(user_id)
@@ -10,14 +10,31 @@ class Settings(BaseSettings):
     SUPABASE_ANON_KEY: str
     SUPABASE_SERVICE_ROLE_KEY: str
     
+    # Threads available for blocking Supabase calls (match the Postgres pool size)
+    DB_EXECUTOR_WORKERS: int = 20
+    
+    # Idle PostgREST connections are kept open this long before being dropped
+    DB_KEEPALIVE_SECONDS: float = 60.0
+    
+    # How long balance/transaction reads stay cached (see core/cache.py). The cache is
+    # per worker, so this also bounds how stale a read can be after another worker's write
+    READ_CACHE_TTL_SECONDS: int = 2
+    
     # JWT Configuration
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 10080  # 7 days
+    PIN_TOKEN_EXPIRE_MINUTES: int = 5  # purchase authorizations from /link/authorize
     
     # Google OAuth
     GOOGLE_CLIENT_ID: str = ""
     
+    # slowapi storage backend (see core/rate_limit.py); use redis://... with several workers
+    RATE_LIMIT_STORAGE_URI: str = "memory://"
+    
+    # Set by the test suite; disables rate limiting and the HTTP middleware
+    TESTING: bool = False
+    
     # SMSINDIAHUB OTP Configuration
     SMSINDIAHUB_API_KEY: str
     SMSINDIAHUB_SENDER_ID: str
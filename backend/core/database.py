@@ -1,31 +1,83 @@
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
+from postgrest.utils import SyncClient
 from core.config import get_settings
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, TypeVar
+import asyncio
+import httpx
 
 settings = get_settings()
 
-# Initialize Supabase client
-supabase: Optional[Client] = None
+T = TypeVar("T")
 
+# supabase-py is synchronous, so queries run here instead of on the event loop
+_db_executor = ThreadPoolExecutor(
+    max_workers=settings.DB_EXECUTOR_WORKERS,
+    thread_name_prefix="supabase"
+)
+
+
+@lru_cache(maxsize=1)
 def get_supabase_client() -> Client:
-    """Get or create Supabase client instance"""
-    global supabase
-    if supabase is None:
-        try:
-            supabase = create_client(
-                settings.SUPABASE_URL,
-                settings.SUPABASE_SERVICE_ROLE_KEY
-            )
-        except Exception as e:
-            raise Exception(f"Failed to connect to Supabase: {str(e)}")
-    return supabase
+    """
+    Get the shared Supabase client instance.
+    Created once per process so every request reuses the same
+    PostgREST HTTP session instead of reconnecting.
+    """
+    try:
+        client = create_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_SERVICE_ROLE_KEY
+        )
+    except Exception as e:
+        raise Exception(f"Failed to connect to Supabase: {str(e)}")
+    
+    _tune_postgrest_pool(client)
+    return client
+
+
+def _tune_postgrest_pool(client: Client) -> None:
+    """
+    Replace the PostgREST session with one whose keep-alive pool matches the
+    DB executor. httpx's defaults drop idle connections after 5 seconds, so
+    bursty traffic kept paying for fresh TLS handshakes.
+    """
+    session = client.postgrest.session
+    client.postgrest.session = SyncClient(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=session.timeout,
+        limits=httpx.Limits(
+            max_keepalive_connections=settings.DB_EXECUTOR_WORKERS,
+            keepalive_expiry=settings.DB_KEEPALIVE_SECONDS
+        )
+    )
+    session.close()
+
+
+def users_table():
+    """Fresh query builder for the users table on the shared client"""
+    return get_supabase_client().table("users")
+
+
+async def run_db(query: Callable[[], T]) -> T:
+    """Run a blocking Supabase query on the database thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, query)
+
+
+def is_unique_violation(error: APIError, column: str) -> bool:
+    """Check if a PostgREST error is a unique-constraint violation on the given column"""
+    return error.code == "23505" and f"({column})" in (error.details or "")
 
 
 def test_connection() -> bool:
     """Test Supabase connection"""
     try:
         client = get_supabase_client()
-        # Try a simple query to test connection
+        # A one-row query checks the database and leaves a warm pooled connection
+        client.table("merchants").select("id").limit(1).execute()
         return True
     except Exception as e:
         print(f"Connection test failed: {str(e)}")
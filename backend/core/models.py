@@ -108,6 +108,28 @@ class UserResponse(BaseModel):
     created_at: Optional[datetime] = None
 
 
+class LoginResponse(BaseModel):
+    """Model for user login response"""
+    message: str
+    user_id: str
+    user_name: str
+    access_token: str
+    token_type: str
+
+
+class Notification(BaseModel):
+    """Model for a payment reminder shown to a user"""
+    id: int
+    merchant_id: str
+    store_name: str
+    balance: float
+    message: str
+    reminder_date: datetime
+    status: str
+    created_at: Optional[datetime] = None
+    type: str = "payment_reminder"
+
+
 # Merchant-User Link Models
 class MerchantUserLink(BaseModel):
     """Model for linking merchant and user"""
@@ -154,6 +176,20 @@ class ProcessTransaction(BaseModel):
     pin: str = Field(..., min_length=4, max_length=6)
 
 
+class PurchaseTransaction(ProcessTransaction):
+    """Model for a purchase; a pin_token from /link/authorize for the same amount can replace the PIN"""
+    pin: Optional[str] = Field(None, min_length=4, max_length=6)
+    pin_token: Optional[str] = None
+
+
+class PurchaseAuthorization(BaseModel):
+    """Model for checking a user's PIN ahead of a single purchase"""
+    merchant_id: str
+    user_id: str
+    amount: float = Field(..., gt=0)
+    pin: str = Field(..., min_length=4, max_length=6)
+
+
 class TransactionResponse(BaseModel):
     """Model for transaction response"""
     id: int
@@ -165,6 +201,39 @@ class TransactionResponse(BaseModel):
     created_at: Optional[datetime] = None
 
 
+class BalanceResponse(BaseModel):
+    """Model for a merchant-user link balance"""
+    merchant_id: str
+    user_id: str
+    balance: float
+
+
+class AddBalanceResponse(BaseModel):
+    """Model for add balance response"""
+    message: str
+    merchant_id: str
+    user_id: str
+    amount_added: float
+    new_balance: float
+    transaction_id: int
+
+
+class PurchaseResponse(BaseModel):
+    """Model for purchase response"""
+    message: str
+    merchant_id: str
+    user_id: str
+    amount_paid: float
+    remaining_balance: float
+    transaction_id: int
+
+
+class PinTokenResponse(BaseModel):
+    """Model for a purchase authorization from /link/authorize"""
+    pin_token: str
+    expires_in: int
+
+
 class BalanceRequest(BaseModel):
     """Model for balance addition request"""
     merchant_id: str
@@ -0,0 +1,17 @@
+"""
+Shared slowapi rate limiter used by main.py and every router
+"""
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+from core.config import get_settings
+
+settings = get_settings()
+
+# One limiter for the whole app so every route counts against the same storage.
+# With the default memory:// each worker keeps its own counters; point
+# RATE_LIMIT_STORAGE_URI at Redis (e.g. redis://localhost:6379) to share them.
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=settings.RATE_LIMIT_STORAGE_URI,
+    enabled=not settings.TESTING
+)
@@ -7,21 +7,37 @@ import secrets
 import hashlib
 
 settings = get_settings()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# New hashes use Argon2id (OWASP minimum: 19 MiB memory, 2 iterations, 1 lane).
+# bcrypt stays in the list so existing hashes still verify; they are marked
+# deprecated so password_needs_rehash() flags them for upgrade on next login.
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__time_cost=2,
+    argon2__memory_cost=19456,
+    argon2__parallelism=1,
+)
 
 
 def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
+    """Hash a password using Argon2id"""
     return pwd_context.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
+    """Verify a password against its hash (Argon2id or legacy bcrypt)"""
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Check if a stored hash uses a deprecated scheme or outdated parameters"""
+    return pwd_context.needs_update(hashed_password)
+
+
 def hash_pin(pin: str) -> str:
-    """Hash a 4-digit PIN using bcrypt (same as password)"""
+    """Hash a 4-digit PIN using Argon2id (same as password)"""
     return pwd_context.hash(pin)
 
 
@@ -37,13 +53,6 @@ def generate_merchant_id() -> str:
     return f"MR{hash_value}"
 
 
-def generate_user_id() -> str:
-    """Generate a unique 6-digit user ID starting with UR"""
-    random_bytes = secrets.token_bytes(3)
-    hash_value = hashlib.sha256(random_bytes).hexdigest()[:6].upper()
-    return f"UR{hash_value}"
-
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
@@ -57,6 +66,39 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+def create_pin_token(merchant_id: str, user_id: str, amount: float) -> str:
+    """
+    Create a short-lived token proving the user's PIN was checked for one purchase
+    of this amount at this merchant. The jti lets the purchase mark it as spent.
+    It has no "sub" claim, so it can't be used as an access token.
+    """
+    return create_access_token(
+        data={
+            "scope": "purchase",
+            "merchant_id": merchant_id,
+            "user_id": user_id,
+            "amount": round(amount, 2),
+            "jti": secrets.token_urlsafe(16)
+        },
+        expires_delta=timedelta(minutes=settings.PIN_TOKEN_EXPIRE_MINUTES)
+    )
+
+
+def verify_pin_token(token: str, merchant_id: str, user_id: str, amount: float) -> Optional[dict]:
+    """
+    Return a PIN token's payload if it is unexpired and was issued for this
+    merchant-user link and amount. Whether it was already spent is up to the caller.
+    """
+    payload = verify_token(token)
+    if not payload or payload.get("scope") != "purchase" or not payload.get("jti"):
+        return None
+    if payload.get("merchant_id") != merchant_id or payload.get("user_id") != user_id:
+        return None
+    if payload.get("amount") != round(amount, 2):
+        return None
+    return payload
+
+
 def verify_token(token: str) -> Optional[dict]:
     """Verify JWT token and return payload"""
     try:
@@ -1,10 +1,33 @@
 from fastapi import WebSocket
-from typing import Dict, List, Set
-import json
+from typing import Coroutine, Dict, List, Set
+import asyncio
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Strong references to in-flight broadcast tasks so they aren't garbage collected
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _on_broadcast_done(task: asyncio.Task):
+    """Drop the finished task and log any exception it raised"""
+    _background_tasks.discard(task)
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.error(f"Background broadcast failed: {str(exc)}")
+
+
+def fire_and_forget(coro: Coroutine) -> asyncio.Task:
+    """Schedule a broadcast coroutine without blocking the HTTP response"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_broadcast_done)
+    return task
+
+
 class ConnectionManager:
     """Manages WebSocket connections for users and merchants"""
     
@@ -47,17 +70,26 @@ class ConnectionManager:
         except Exception as e:
             logger.error(f"Error disconnecting: {str(e)}")
     
+    async def _send_all(self, websockets: List[WebSocket], message: dict) -> List[WebSocket]:
+        """Write a message to every socket concurrently and return the ones that failed"""
+        # Encode once and send the same text frame to every socket
+        frame = orjson.dumps(message).decode()
+        results = await asyncio.gather(
+            *(websocket.send_text(frame) for websocket in websockets),
+            return_exceptions=True
+        )
+        failed = []
+        for websocket, result in zip(websockets, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error sending {message.get('event')}: {str(result)}")
+                failed.append(websocket)
+        return failed
+    
     async def send_to_user(self, user_id: str, message: dict):
         """Send message to all connections of a specific user"""
         if user_id in self.user_connections:
-            disconnected = []
-            for websocket in self.user_connections[user_id]:
-                try:
-                    await websocket.send_json(message)
-                    logger.info(f"Sent message to user {user_id}: {message.get('event')}")
-                except Exception as e:
-                    logger.error(f"Error sending to user {user_id}: {str(e)}")
-                    disconnected.append(websocket)
+            disconnected = await self._send_all(list(self.user_connections[user_id]), message)
+            logger.info(f"Sent message to user {user_id}: {message.get('event')}")
             
             # Clean up disconnected websockets
             for ws in disconnected:
@@ -66,14 +98,8 @@ class ConnectionManager:
     async def send_to_merchant(self, merchant_id: str, message: dict):
         """Send message to all connections of a specific merchant"""
         if merchant_id in self.merchant_connections:
-            disconnected = []
-            for websocket in self.merchant_connections[merchant_id]:
-                try:
-                    await websocket.send_json(message)
-                    logger.info(f"Sent message to merchant {merchant_id}: {message.get('event')}")
-                except Exception as e:
-                    logger.error(f"Error sending to merchant {merchant_id}: {str(e)}")
-                    disconnected.append(websocket)
+            disconnected = await self._send_all(list(self.merchant_connections[merchant_id]), message)
+            logger.info(f"Sent message to merchant {merchant_id}: {message.get('event')}")
             
             # Clean up disconnected websockets
             for ws in disconnected:
@@ -1,9 +1,9 @@
 from fastapi import FastAPI, Request, status, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, ORJSONResponse
 from fastapi.exceptions import RequestValidationError
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from fastapi.encoders import jsonable_encoder
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from contextlib import asynccontextmanager
 from routes.merchant_routes import router as merchant_router
@@ -12,14 +12,16 @@ from routes.transaction_routes import router as transaction_router
 from routes.balance_request_routes import router as balance_request_router
 from routes.link_request_routes import router as link_request_router
 from routes.oauth_routes import router as oauth_router
-from routes.otp_routes import router as otp_router
+from routes.otp_routes import router as otp_router, open_sms_client, close_sms_client
 from routes.check_routes import router as check_router
 from routes.websocket_routes import router as websocket_router
 from routes.pay_request_routes import router as pay_request_router
 from core.database import test_connection
+from core.config import get_settings
+from core.rate_limit import limiter
 import uvicorn
 
-limiter = Limiter(key_func=get_remote_address)
+settings = get_settings()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -28,10 +30,12 @@ async def lifespan(app: FastAPI):
         print("Database connection successful")
     else:
         print("Database connection failed. Check your .env file")
+    open_sms_client()
     
     yield
     
     # Shutdown
+    await close_sms_client()
     print("MEWallet API shutting down")
 
 # Create FastAPI app
@@ -39,15 +43,15 @@ app = FastAPI(
     title="MEWallet API",
     description="Digital Wallet API for Merchant-User transactions",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# Add rate limiter
+# Add rate limiter (shared with the routers, disabled under TESTING)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 # Middleware to block browser access to API endpoints
-@app.middleware("http")
 async def block_browser_access(request: Request, call_next):
     """Block direct browser access to API endpoints"""
     path = request.url.path
@@ -95,20 +99,25 @@ async def block_browser_access(request: Request, call_next):
     
     return await call_next(request)
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "https://mewallet.tgenie.in",
-        "https://*.tgenie.in",
-        "http://localhost:*",
-        "http://127.0.0.1:*",
-        "*",  # Allow all origins for local development
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Under TESTING the browser-block/CORS middleware is left out, so test requests
+# go straight to the routes
+if not settings.TESTING:
+    app.middleware("http")(block_browser_access)
+    
+    # CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[
+            "https://mewallet.tgenie.in",
+            "https://*.tgenie.in",
+            "http://localhost:*",
+            "http://127.0.0.1:*",
+            "*",  # Allow all origins for local development
+        ],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
 
 # Exception handlers
@@ -119,7 +128,8 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
             "detail": "Validation error",
-            "errors": exc.errors()
+            # ctx holds the ValueError raised by a @validator, which json.dumps rejects
+            "errors": jsonable_encoder(exc.errors())
         }
     )
 
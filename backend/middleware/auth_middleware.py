@@ -1,9 +1,82 @@
 """
 Authentication middleware and dependencies for JWT validation
 """
-from fastapi import Header, HTTPException, status
+from fastapi import Header, HTTPException, Request, status
 from typing import Optional
+from cachetools import TTLCache
+from slowapi.util import get_remote_address
 from core.utils import verify_token
+import hashlib
+import time
+
+# Decoded token claims keyed by a hash of the raw token, so repeat requests
+# with the same bearer token skip signature verification
+_token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+# Failed logins per (client IP, account); each failure restarts the window.
+# Keying on the client as well means a stranger guessing at an account only
+# locks themselves out, not the owner. Only wrong passwords for accounts that
+# exist are counted, so probing unknown phones doesn't fill the cache.
+# Failures are also counted per account across all clients, with a higher
+# threshold, so rotating IPs doesn't buy an attacker unlimited guesses. A
+# successful login only clears the client's own count; the account count runs
+# out with its window.
+# Counts live in this process: with N workers a client gets up to N x the limit.
+LOGIN_MAX_FAILURES = 5
+LOGIN_ACCOUNT_MAX_FAILURES = 20
+LOGIN_LOCKOUT_SECONDS = 900
+_login_failures: TTLCache = TTLCache(maxsize=100_000, ttl=LOGIN_LOCKOUT_SECONDS)
+_account_failures: TTLCache = TTLCache(maxsize=100_000, ttl=LOGIN_LOCKOUT_SECONDS)
+
+
+def _verify_token_cached(token: str) -> Optional[dict]:
+    """Verify JWT token, reusing the decoded payload until it expires"""
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    
+    cached = _token_cache.get(key)
+    if cached is not None:
+        payload, exp = cached
+        if time.time() < exp:
+            return payload
+        _token_cache.pop(key, None)
+    
+    payload = verify_token(token)
+    if payload:
+        _token_cache[key] = (payload, payload.get("exp", 0))
+    
+    return payload
+
+
+def login_attempt_key(request: Request, account: str) -> tuple:
+    """Key login failures by the caller's address and the account they're trying"""
+    return (get_remote_address(request), account)
+
+
+def check_login_allowed(account_key: tuple) -> None:
+    """
+    Reject a login when the client has too many recent failures for the account,
+    or the account has too many from all clients together.
+    Call before the password lookup so locked-out attempts never reach the hash check.
+    """
+    _, account = account_key
+    if (_login_failures.get(account_key, 0) >= LOGIN_MAX_FAILURES
+            or _account_failures.get(account, 0) >= LOGIN_ACCOUNT_MAX_FAILURES):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts. Please try again later.",
+        )
+
+
+def record_login_failure(account_key: tuple) -> None:
+    """Count a wrong password for an existing account against the client and the account"""
+    _, account = account_key
+    _login_failures[account_key] = _login_failures.get(account_key, 0) + 1
+    _account_failures[account] = _account_failures.get(account, 0) + 1
+
+
+def clear_login_failures(account_key: tuple) -> None:
+    """Reset the client's failure count for an account after a successful login"""
+    _login_failures.pop(account_key, None)
 
 
 async def get_current_user(authorization: Optional[str] = Header(None, alias="Authorization")) -> dict:
@@ -35,9 +108,9 @@ async def get_current_user(authorization: Optional[str] = Header(None, alias="Au
     
     token = parts[1]
     
-    # Verify token
-    payload = verify_token(token)
-    if not payload:
+    # Verify token; PIN tokens from /link/authorize carry no "sub" and are not access tokens
+    payload = _verify_token_cached(token)
+    if not payload or "sub" not in payload:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
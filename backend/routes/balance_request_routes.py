@@ -1,13 +1,12 @@
 from fastapi import APIRouter, HTTPException, status, BackgroundTasks, Depends, Request
 from core.database import get_supabase_client
 from core.models import BalanceRequest
+from core.cache import invalidate_link
 from middleware.auth_middleware import get_current_user
 from datetime import datetime
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from core.rate_limit import limiter
 import asyncio
 
-limiter = Limiter(key_func=get_remote_address)
 
 router = APIRouter(prefix="/balance-requests", tags=["Balance Requests"])
 
@@ -17,7 +16,7 @@ async def delete_request_after_delay(request_id: int, delay_seconds: int = 10):
     await asyncio.sleep(delay_seconds)
     try:
         supabase = get_supabase_client()
-        supabase.table("balance_requests").delete().eq("id", request_id).execute()
+        supabase.table("balance_requests").delete(returning="minimal").eq("id", request_id).execute()
         print(f"Deleted balance request {request_id} after {delay_seconds} seconds")
     except Exception as e:
         print(f"Error deleting request {request_id}: {str(e)}")
@@ -31,7 +30,7 @@ async def create_balance_request(request: Request, request_data: BalanceRequest,
         supabase = get_supabase_client()
         
         # Verify merchant exists
-        merchant = supabase.table("merchants").select("*").eq("id", request_data.merchant_id).execute()
+        merchant = supabase.table("merchants").select("id").eq("id", request_data.merchant_id).limit(1).execute()
         if not merchant.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -39,7 +38,7 @@ async def create_balance_request(request: Request, request_data: BalanceRequest,
             )
         
         # Verify user exists
-        user = supabase.table("users").select("*").eq("id", request_data.user_id).execute()
+        user = supabase.table("users").select("id").eq("id", request_data.user_id).limit(1).execute()
         if not user.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -47,9 +46,9 @@ async def create_balance_request(request: Request, request_data: BalanceRequest,
             )
         
         # Check if there's already a pending request
-        existing = supabase.table("balance_requests").select("*").eq(
+        existing = supabase.table("balance_requests").select("id").eq(
             "merchant_id", request_data.merchant_id
-        ).eq("user_id", request_data.user_id).eq("status", "pending").execute()
+        ).eq("user_id", request_data.user_id).eq("status", "pending").limit(1).execute()
         
         if existing.data:
             raise HTTPException(
@@ -133,7 +132,7 @@ async def accept_balance_request(request: Request, request_id: int, background_t
         supabase = get_supabase_client()
         
         # Get the request
-        request = supabase.table("balance_requests").select("*").eq("id", request_id).execute()
+        request = supabase.table("balance_requests").select("status, merchant_id, user_id, amount, pin").eq("id", request_id).execute()
         
         if not request.data:
             raise HTTPException(
@@ -150,9 +149,9 @@ async def accept_balance_request(request: Request, request_id: int, background_t
             )
         
         # Check if link exists
-        link = supabase.table("merchant_user_links").select("*").eq(
+        link = supabase.table("merchant_user_links").select("id, balance").eq(
             "merchant_id", req_data["merchant_id"]
-        ).eq("user_id", req_data["user_id"]).execute()
+        ).eq("user_id", req_data["user_id"]).limit(1).execute()
         
         if link.data:
             # Update existing link balance
@@ -161,7 +160,7 @@ async def accept_balance_request(request: Request, request_id: int, background_t
             
             supabase.table("merchant_user_links").update({
                 "balance": new_balance
-            }).eq("id", link_data["id"]).execute()
+            }, returning="minimal").eq("id", link_data["id"]).execute()
         else:
             # Create new link
             new_balance = req_data["amount"]
@@ -170,7 +169,7 @@ async def accept_balance_request(request: Request, request_id: int, background_t
                 "user_id": req_data["user_id"],
                 "pin": req_data["pin"],
                 "balance": new_balance
-            }).execute()
+            }, returning="minimal").execute()
         
         # Record transaction
         supabase.table("transactions").insert({
@@ -179,12 +178,13 @@ async def accept_balance_request(request: Request, request_id: int, background_t
             "amount": req_data["amount"],
             "transaction_type": "credit",
             "balance_after": new_balance
-        }).execute()
+        }, returning="minimal").execute()
+        invalidate_link(req_data["merchant_id"], req_data["user_id"])
         
         # Update request status
         supabase.table("balance_requests").update({
             "status": "accepted"
-        }).eq("id", request_id).execute()
+        }, returning="minimal").eq("id", request_id).execute()
         
         # Schedule deletion after 10 seconds
         background_tasks.add_task(delete_request_after_delay, request_id, 10)
@@ -211,7 +211,7 @@ async def reject_balance_request(request: Request, request_id: int, background_t
         supabase = get_supabase_client()
         
         # Get the request
-        request = supabase.table("balance_requests").select("*").eq("id", request_id).execute()
+        request = supabase.table("balance_requests").select("status").eq("id", request_id).execute()
         
         if not request.data:
             raise HTTPException(
@@ -228,7 +228,7 @@ async def reject_balance_request(request: Request, request_id: int, background_t
         # Update request status
         supabase.table("balance_requests").update({
             "status": "rejected"
-        }).eq("id", request_id).execute()
+        }, returning="minimal").eq("id", request_id).execute()
         
         # Schedule deletion after 10 seconds
         background_tasks.add_task(delete_request_after_delay, request_id, 10)
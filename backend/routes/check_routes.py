@@ -1,11 +1,9 @@
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from core.rate_limit import limiter
 from core.database import get_supabase_client
 
 router = APIRouter(prefix="/check", tags=["Validation"])
-limiter = Limiter(key_func=get_remote_address)
 
 class PhoneCheckRequest(BaseModel):
     phone: str
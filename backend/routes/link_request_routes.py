@@ -1,14 +1,14 @@
 from fastapi import APIRouter, HTTPException, status, BackgroundTasks, Depends, Request
-from core.database import get_supabase_client
+from core.database import get_supabase_client, is_unique_violation
 from core.models import LinkRequest
 from core.utils import hash_password
+from postgrest.exceptions import APIError
+from core.cache import invalidate_link
 from middleware.auth_middleware import get_current_user
 from datetime import datetime
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from core.rate_limit import limiter
 import asyncio
 
-limiter = Limiter(key_func=get_remote_address)
 
 router = APIRouter(prefix="/link-requests", tags=["Link Requests"])
 
@@ -18,7 +18,7 @@ async def delete_link_request_after_delay(request_id: int, delay_seconds: int =
     await asyncio.sleep(delay_seconds)
     try:
         supabase = get_supabase_client()
-        supabase.table("link_requests").delete().eq("id", request_id).execute()
+        supabase.table("link_requests").delete(returning="minimal").eq("id", request_id).execute()
         print(f"Deleted link request {request_id} after {delay_seconds} seconds")
     except Exception as e:
         print(f"Error deleting link request {request_id}: {str(e)}")
@@ -32,7 +32,7 @@ async def create_link_request(request: Request, request_data: LinkRequest, curre
         supabase = get_supabase_client()
         
         # Verify merchant exists
-        merchant = supabase.table("merchants").select("*").eq("id", request_data.merchant_id).execute()
+        merchant = supabase.table("merchants").select("id").eq("id", request_data.merchant_id).limit(1).execute()
         if not merchant.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -40,7 +40,7 @@ async def create_link_request(request: Request, request_data: LinkRequest, curre
             )
         
         # Verify user exists
-        user = supabase.table("users").select("*").eq("id", request_data.user_id).execute()
+        user = supabase.table("users").select("id").eq("id", request_data.user_id).limit(1).execute()
         if not user.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -48,9 +48,9 @@ async def create_link_request(request: Request, request_data: LinkRequest, curre
             )
         
         # Check if already linked
-        existing_link = supabase.table("merchant_user_links").select("*").eq(
+        existing_link = supabase.table("merchant_user_links").select("id").eq(
             "merchant_id", request_data.merchant_id
-        ).eq("user_id", request_data.user_id).execute()
+        ).eq("user_id", request_data.user_id).limit(1).execute()
         
         if existing_link.data:
             raise HTTPException(
@@ -59,9 +59,9 @@ async def create_link_request(request: Request, request_data: LinkRequest, curre
             )
         
         # Check if there's already a pending request
-        existing_request = supabase.table("link_requests").select("*").eq(
+        existing_request = supabase.table("link_requests").select("id").eq(
             "merchant_id", request_data.merchant_id
-        ).eq("user_id", request_data.user_id).eq("status", "pending").execute()
+        ).eq("user_id", request_data.user_id).eq("status", "pending").limit(1).execute()
         
         if existing_request.data:
             raise HTTPException(
@@ -144,7 +144,7 @@ async def accept_link_request(request: Request, request_id: int, background_task
         supabase = get_supabase_client()
         
         # Get the request
-        request = supabase.table("link_requests").select("*").eq("id", request_id).execute()
+        request = supabase.table("link_requests").select("status, merchant_id, user_id, pin").eq("id", request_id).execute()
         
         if not request.data:
             raise HTTPException(
@@ -160,42 +160,34 @@ async def accept_link_request(request: Request, request_id: int, background_task
                 detail="Request has already been processed"
             )
         
-        # Check if link already exists (race condition check)
-        existing_link = supabase.table("merchant_user_links").select("*").eq(
-            "merchant_id", req_data["merchant_id"]
-        ).eq("user_id", req_data["user_id"]).execute()
-        
-        if existing_link.data:
-            # Update request status and schedule deletion
-            supabase.table("link_requests").update({
-                "status": "accepted"
-            }).eq("id", request_id).execute()
-            
-            background_tasks.add_task(delete_link_request_after_delay, request_id, 10)
-            
-            return {
-                "message": "Link already exists",
-                "user_id": req_data["user_id"]
-            }
-        
-        # Create new link with zero balance
-        supabase.table("merchant_user_links").insert({
-            "merchant_id": req_data["merchant_id"],
-            "user_id": req_data["user_id"],
-            "pin": hash_password(req_data["pin"]),
-            "balance": 0.0
-        }).execute()
+        hashed_pin = await asyncio.to_thread(hash_password, req_data["pin"])
+        
+        # Create new link with zero balance; UNIQUE(merchant_id, user_id)
+        # catches a link that was created since the request was made
+        try:
+            supabase.table("merchant_user_links").insert({
+                "merchant_id": req_data["merchant_id"],
+                "user_id": req_data["user_id"],
+                "pin": hashed_pin,
+                "balance": 0.0
+            }, returning="minimal").execute()
+            link_existed = False
+        except APIError as e:
+            if not is_unique_violation(e, "merchant_id, user_id"):
+                raise
+            link_existed = True
+        invalidate_link(req_data["merchant_id"], req_data["user_id"])
         
         # Update request status
         supabase.table("link_requests").update({
             "status": "accepted"
-        }).eq("id", request_id).execute()
+        }, returning="minimal").eq("id", request_id).execute()
         
         # Schedule deletion after 10 seconds
         background_tasks.add_task(delete_link_request_after_delay, request_id, 10)
         
         return {
-            "message": "Link request accepted successfully",
+            "message": "Link already exists" if link_existed else "Link request accepted successfully",
             "user_id": req_data["user_id"]
         }
         
@@ -216,7 +208,7 @@ async def reject_link_request(request: Request, request_id: int, background_task
         supabase = get_supabase_client()
         
         # Get the request
-        request = supabase.table("link_requests").select("*").eq("id", request_id).execute()
+        request = supabase.table("link_requests").select("status").eq("id", request_id).execute()
         
         if not request.data:
             raise HTTPException(
@@ -233,7 +225,7 @@ async def reject_link_request(request: Request, request_id: int, background_task
         # Update request status
         supabase.table("link_requests").update({
             "status": "rejected"
-        }).eq("id", request_id).execute()
+        }, returning="minimal").eq("id", request_id).execute()
         
         # Schedule deletion after 10 seconds
         background_tasks.add_task(delete_link_request_after_delay, request_id, 10)
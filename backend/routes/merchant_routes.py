@@ -1,19 +1,25 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Request
-from core.database import get_supabase_client
+from core.database import get_supabase_client, is_unique_violation
 from core.models import MerchantCreate, MerchantLogin, MerchantResponse, Token
 from core.utils import hash_password, verify_password, generate_merchant_id, create_access_token
-from middleware.auth_middleware import get_current_user, verify_resource_ownership
+from middleware.auth_middleware import (
+    get_current_user, verify_resource_ownership,
+    login_attempt_key, check_login_allowed, record_login_failure, clear_login_failures
+)
 from datetime import timedelta, datetime
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from core.rate_limit import limiter
 from google.oauth2 import id_token
 from google.auth.transport import requests
 from core.config import get_settings
 from pydantic import BaseModel
 from typing import Optional
+from postgrest.exceptions import APIError
+import asyncio
 
 settings = get_settings()
-limiter = Limiter(key_func=get_remote_address)
+
+# Attempts at inserting a merchant before giving up on generated ID collisions
+MERCHANT_ID_MAX_ATTEMPTS = 3
 
 router = APIRouter(prefix="/merchant", tags=["Merchant"])
 
@@ -39,35 +45,30 @@ async def register_merchant(request: Request, merchant: MerchantCreate):
     try:
         supabase = get_supabase_client()
         
-        # Check if phone already exists
-        existing = supabase.table("merchants").select("*").eq("phone", merchant.phone).execute()
-        if existing.data:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Phone number already registered"
-            )
-        
-        # Generate unique merchant ID
-        merchant_id = generate_merchant_id()
+        # Hash password on a worker thread so the event loop isn't blocked
+        hashed_password = await asyncio.to_thread(hash_password, merchant.password)
         
-        # Ensure ID is unique
-        while True:
-            check = supabase.table("merchants").select("*").eq("id", merchant_id).execute()
-            if not check.data:
-                break
+        # Insert merchant. The unique constraints on phone and id do the checks:
+        # a taken phone is reported, a colliding generated ID is retried
+        for attempt in range(MERCHANT_ID_MAX_ATTEMPTS):
             merchant_id = generate_merchant_id()
-        
-        # Hash password
-        hashed_password = hash_password(merchant.password)
-        
-        # Insert merchant
-        result = supabase.table("merchants").insert({
-            "id": merchant_id,
-            "store_name": merchant.store_name,
-            "phone": merchant.phone,
-            "password": hashed_password,
-            "profile_completed": True  # Profile is complete during registration
-        }).execute()
+            try:
+                result = supabase.table("merchants").insert({
+                    "id": merchant_id,
+                    "store_name": merchant.store_name,
+                    "phone": merchant.phone,
+                    "password": hashed_password,
+                    "profile_completed": True  # Profile is complete during registration
+                }).execute()
+                break
+            except APIError as e:
+                if is_unique_violation(e, "phone"):
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Phone number already registered"
+                    )
+                if not is_unique_violation(e, "id") or attempt == MERCHANT_ID_MAX_ATTEMPTS - 1:
+                    raise
         
         if not result.data:
             raise HTTPException(
@@ -102,11 +103,14 @@ async def register_merchant(request: Request, merchant: MerchantCreate):
 @limiter.limit("10/minute")
 async def login_merchant(request: Request, merchant: MerchantLogin):
     """Login merchant"""
+    account_key = login_attempt_key(request, f"merchant:{merchant.phone}")
     try:
+        check_login_allowed(account_key)
+        
         supabase = get_supabase_client()
         
         # Find merchant by phone
-        result = supabase.table("merchants").select("*").eq("phone", merchant.phone).execute()
+        result = supabase.table("merchants").select("id, store_name, password").eq("phone", merchant.phone).limit(1).execute()
         
         if not result.data:
             raise HTTPException(
@@ -117,12 +121,15 @@ async def login_merchant(request: Request, merchant: MerchantLogin):
         merchant_data = result.data[0]
         
         # Verify password
-        if not verify_password(merchant.password, merchant_data["password"]):
+        if not await asyncio.to_thread(verify_password, merchant.password, merchant_data["password"]):
+            record_login_failure(account_key)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials"
             )
         
+        clear_login_failures(account_key)
+        
         # Create access token
         access_token = create_access_token(
             data={"sub": merchant_data["id"], "user_type": "merchant"},
@@ -309,8 +316,8 @@ async def link_google_to_merchant(link_data: dict, current_user: dict = Depends(
         supabase = get_supabase_client()
         
         # Check if Google ID is already linked to another account
-        existing = supabase.table("merchants").select("*").eq("google_id", google_id).execute()
-        if existing.data and existing.data[0]["id"] != merchant_id:
+        existing = supabase.table("merchants").select("id").eq("google_id", google_id).neq("id", merchant_id).limit(1).execute()
+        if existing.data:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="This Google account is already linked to another merchant"
@@ -367,7 +374,7 @@ async def set_merchant_password(password_data: dict, current_user: dict = Depend
         
         # Hash the password
         from core.utils import hash_password
-        hashed_password = hash_password(password)
+        hashed_password = await asyncio.to_thread(hash_password, password)
         
         # Update merchant password
         result = supabase.table("merchants").update({
@@ -429,7 +436,7 @@ async def update_merchant_password(password_data: dict, current_user: dict = Dep
         
         # Verify old password
         from core.utils import verify_password
-        if not current_password_hash or not verify_password(old_password, current_password_hash):
+        if not current_password_hash or not await asyncio.to_thread(verify_password, old_password, current_password_hash):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Current password is incorrect"
@@ -437,7 +444,7 @@ async def update_merchant_password(password_data: dict, current_user: dict = Dep
         
         # Hash the new password
         from core.utils import hash_password
-        hashed_password = hash_password(new_password)
+        hashed_password = await asyncio.to_thread(hash_password, new_password)
         
         # Update merchant password
         update_result = supabase.table("merchants").update({
@@ -629,7 +636,7 @@ async def update_reminder(reminder_id: int, reminder_update: ReminderUpdate, cur
         supabase = get_supabase_client()
         
         # Verify reminder belongs to merchant
-        check_result = supabase.table("reminders").select("*").eq("id", reminder_id).eq("merchant_id", merchant_id).execute()
+        check_result = supabase.table("reminders").select("id").eq("id", reminder_id).eq("merchant_id", merchant_id).limit(1).execute()
         
         if not check_result.data:
             raise HTTPException(
@@ -703,7 +710,7 @@ async def delete_reminder(reminder_id: int, current_user: dict = Depends(get_cur
         supabase = get_supabase_client()
         
         # Verify reminder belongs to merchant
-        check_result = supabase.table("reminders").select("*").eq("id", reminder_id).eq("merchant_id", merchant_id).execute()
+        check_result = supabase.table("reminders").select("id").eq("id", reminder_id).eq("merchant_id", merchant_id).limit(1).execute()
         
         if not check_result.data:
             raise HTTPException(
@@ -711,7 +718,7 @@ async def delete_reminder(reminder_id: int, current_user: dict = Depends(get_cur
                 detail="Reminder not found or unauthorized"
             )
         
-        result = supabase.table("reminders").delete().eq("id", reminder_id).execute()
+        supabase.table("reminders").delete(returning="minimal").eq("id", reminder_id).execute()
         
         return {
             "message": "Reminder deleted successfully"
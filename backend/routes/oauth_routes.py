@@ -1,16 +1,16 @@
 from fastapi import APIRouter, HTTPException, status, Request, Depends
-from core.database import get_supabase_client
+from core.database import get_supabase_client, is_unique_violation
 from core.models import GoogleOAuthLogin, MerchantOAuthProfileComplete, UserOAuthProfileComplete
-from core.utils import generate_merchant_id, generate_user_id, create_access_token
+from core.utils import generate_merchant_id, create_access_token
 from core.config import get_settings
 from google.oauth2 import id_token
 from google.auth.transport import requests
 from datetime import timedelta
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from core.rate_limit import limiter
 from middleware.auth_middleware import get_current_user
+from postgrest.exceptions import APIError
+import asyncio
 
-limiter = Limiter(key_func=get_remote_address)
 
 router = APIRouter(prefix="/oauth", tags=["OAuth"])
 
@@ -18,6 +18,9 @@ router = APIRouter(prefix="/oauth", tags=["OAuth"])
 settings = get_settings()
 GOOGLE_CLIENT_ID = settings.GOOGLE_CLIENT_ID
 
+# Attempts at inserting an account before giving up on generated ID collisions
+ID_MAX_ATTEMPTS = 3
+
 
 @router.post("/google", response_model=dict)
 @limiter.limit("10/minute")
@@ -61,7 +64,7 @@ async def google_oauth_login(request: Request, oauth_data: GoogleOAuthLogin):
         # Handle user OAuth
         if oauth_data.user_type == "user":
             # First check if user exists with this Google email
-            result = supabase.table("users").select("*").eq("google_email", google_email).execute()
+            result = supabase.table("users").select("id, user_name, google_id, profile_completed").eq("google_email", google_email).execute()
             
             if result.data:
                 # User exists with this email
@@ -71,7 +74,7 @@ async def google_oauth_login(request: Request, oauth_data: GoogleOAuthLogin):
                 if not user_data.get("google_id"):
                     supabase.table("users").update({
                         "google_id": google_id
-                    }).eq("id", user_data["id"]).execute()
+                    }, returning="minimal").eq("id", user_data["id"]).execute()
                 
                 access_token = create_access_token(
                     data={"sub": user_data["id"], "user_type": "user"},
@@ -88,7 +91,7 @@ async def google_oauth_login(request: Request, oauth_data: GoogleOAuthLogin):
                 }
             else:
                 # Check by google_id as fallback
-                result = supabase.table("users").select("*").eq("google_id", google_id).execute()
+                result = supabase.table("users").select("id, user_name, profile_completed").eq("google_id", google_id).execute()
                 
                 if result.data:
                     # User exists, login
@@ -107,25 +110,21 @@ async def google_oauth_login(request: Request, oauth_data: GoogleOAuthLogin):
                         "profile_completed": user_data.get("profile_completed", False)
                     }
                 
-                # New user, create incomplete profile
-                user_id = generate_user_id()
-                
-                # Ensure ID is unique
-                while True:
-                    check = supabase.table("users").select("*").eq("id", user_id).execute()
-                    if not check.data:
+                # New user, create incomplete profile. The ID comes from the column default
+                # (see schemas/user_id_default.sql); retry if it collides
+                for attempt in range(ID_MAX_ATTEMPTS):
+                    try:
+                        result = supabase.table("users").insert({
+                            "user_name": google_name or google_email.split('@')[0],
+                            "user_passw": "",  # No password for OAuth users
+                            "google_id": google_id,
+                            "google_email": google_email,
+                            "profile_completed": False  # Needs to complete profile
+                        }).execute()
                         break
-                    user_id = generate_user_id()
-                
-                # Create user with minimal Google info (profile incomplete)
-                result = supabase.table("users").insert({
-                    "id": user_id,
-                    "user_name": google_name or google_email.split('@')[0],
-                    "user_passw": "",  # No password for OAuth users
-                    "google_id": google_id,
-                    "google_email": google_email,
-                    "profile_completed": False  # Needs to complete profile
-                }).execute()
+                    except APIError as e:
+                        if not is_unique_violation(e, "id") or attempt == ID_MAX_ATTEMPTS - 1:
+                            raise
                 
                 if not result.data:
                     raise HTTPException(
@@ -133,6 +132,8 @@ async def google_oauth_login(request: Request, oauth_data: GoogleOAuthLogin):
                         detail="Failed to create user"
                     )
                 
+                user_id = result.data[0]["id"]
+                
                 access_token = create_access_token(
                     data={"sub": user_id, "user_type": "user"},
                     expires_delta=timedelta(minutes=21600)
@@ -151,7 +152,7 @@ async def google_oauth_login(request: Request, oauth_data: GoogleOAuthLogin):
         # Handle merchant OAuth
         elif oauth_data.user_type == "merchant":
             # First check if merchant exists with this Google email
-            result = supabase.table("merchants").select("*").eq("google_email", google_email).execute()
+            result = supabase.table("merchants").select("id, store_name, google_id, profile_completed").eq("google_email", google_email).execute()
             
             if result.data:
                 # Merchant exists with this email
@@ -161,7 +162,7 @@ async def google_oauth_login(request: Request, oauth_data: GoogleOAuthLogin):
                 if not merchant_data.get("google_id"):
                     supabase.table("merchants").update({
                         "google_id": google_id
-                    }).eq("id", merchant_data["id"]).execute()
+                    }, returning="minimal").eq("id", merchant_data["id"]).execute()
                 
                 access_token = create_access_token(
                     data={"sub": merchant_data["id"], "user_type": "merchant"},
@@ -178,7 +179,7 @@ async def google_oauth_login(request: Request, oauth_data: GoogleOAuthLogin):
                 }
             
             # Check by google_id as fallback
-            result = supabase.table("merchants").select("*").eq("google_id", google_id).execute()
+            result = supabase.table("merchants").select("id, store_name, profile_completed").eq("google_id", google_id).execute()
             
             if result.data:
                 # Merchant exists, login
@@ -197,27 +198,24 @@ async def google_oauth_login(request: Request, oauth_data: GoogleOAuthLogin):
                     "profile_completed": merchant_data.get("profile_completed", False)
                 }
             
-            # New merchant, create incomplete profile
-            merchant_id = generate_merchant_id()
-            
-            # Ensure ID is unique
-            while True:
-                check = supabase.table("merchants").select("*").eq("id", merchant_id).execute()
-                if not check.data:
-                    break
+            # New merchant, create incomplete profile; retry if the generated ID collides
+            for attempt in range(ID_MAX_ATTEMPTS):
                 merchant_id = generate_merchant_id()
-            
-            # Create merchant with minimal Google info (profile incomplete)
-            result = supabase.table("merchants").insert({
-                "id": merchant_id,
-                "store_name": "",  # Will be filled in profile completion
-                "owner_name": google_name,  # Prefilled from OAuth
-                "phone": None,  # No phone for OAuth merchants initially
-                "password": "",  # No password for OAuth merchants
-                "google_id": google_id,
-                "google_email": google_email,
-                "profile_completed": False  # Needs to complete profile
-            }).execute()
+                try:
+                    result = supabase.table("merchants").insert({
+                        "id": merchant_id,
+                        "store_name": "",  # Will be filled in profile completion
+                        "owner_name": google_name,  # Prefilled from OAuth
+                        "phone": None,  # No phone for OAuth merchants initially
+                        "password": "",  # No password for OAuth merchants
+                        "google_id": google_id,
+                        "google_email": google_email,
+                        "profile_completed": False  # Needs to complete profile
+                    }).execute()
+                    break
+                except APIError as e:
+                    if not is_unique_violation(e, "id") or attempt == ID_MAX_ATTEMPTS - 1:
+                        raise
             
             if not result.data:
                 raise HTTPException(
@@ -325,7 +323,7 @@ async def complete_user_profile(request: Request, profile_data: UserOAuthProfile
         
         # Hash the PIN
         from core.utils import hash_password
-        hashed_pin = hash_password(profile_data.pin)
+        hashed_pin = await asyncio.to_thread(hash_password, profile_data.pin)
         
         # Update user profile with phone and PIN
         result = supabase.table("users").update({
@@ -1,26 +1,60 @@
 from fastapi import APIRouter, HTTPException, status, Request
 from pydantic import BaseModel
 from core.database import get_supabase_client
-import requests
+from aiobreaker import CircuitBreaker, CircuitBreakerError
+from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type
+from typing import Optional
+import httpx
+import logging
 import random
+import hmac
 import os
+import re
 from datetime import datetime, timedelta
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from core.rate_limit import limiter
 from core.config import get_settings
 
+logger = logging.getLogger(__name__)
+
 settings = get_settings()
-limiter = Limiter(key_func=get_remote_address)
 
 router = APIRouter(prefix="/otp", tags=["OTP"])
 
 SMSINDIAHUB_API_KEY = os.getenv("SMSINDIAHUB_API_KEY")
 SMSINDIAHUB_SENDER_ID = os.getenv("SMSINDIAHUB_SENDER_ID")
 SMSINDIAHUB_GATEWAY_ID = os.getenv("SMSINDIAHUB_GATEWAY_ID")
+SMSINDIAHUB_URL = "http://cloud.smsindiahub.in/vendorsms/pushsms.aspx"
+
+# Static query params; only msisdn and msg change per request
+_SMS_PARAMS_BASE = {
+    "APIKey": SMSINDIAHUB_API_KEY,
+    "sid": SMSINDIAHUB_SENDER_ID,
+    "fl": "0",
+    "gwid": SMSINDIAHUB_GATEWAY_ID
+}
+
+# Shared client so retries and subsequent requests reuse the connection pool.
+# Opened and closed by the app lifespan (see main.py) via open_sms_client/close_sms_client.
+_http: Optional[httpx.AsyncClient] = None
+
+# Opens after 5 consecutive failed sends so callers fail fast while the provider is down
+_sms_breaker = CircuitBreaker(fail_max=5, timeout_duration=timedelta(seconds=30))
+
+# E.164-style phone: optional +, no leading zero, 10-15 digits
+_PHONE_RE = re.compile(r"^\+?[1-9]\d{9,14}$")
 
 # In-memory OTP storage (for production, use Redis)
 otp_storage = {}
 
+OTP_MAX_ATTEMPTS = 3
+
+_OTP_ERRORS = {
+    "none": "No OTP found for this phone number. Please request a new OTP.",
+    "expired": "OTP has expired. Please request a new OTP.",
+    "locked": "Too many failed attempts. Please request a new OTP.",
+    "bad": "Invalid OTP. {attempts_remaining} attempts remaining."
+}
+
 class SendOTPRequest(BaseModel):
     phone: str
 
@@ -28,19 +62,42 @@ class VerifyOTPRequest(BaseModel):
     phone: str
     otp: str
 
+def open_sms_client() -> None:
+    """Create the SMSINDIAHUB HTTP client; called on app startup"""
+    global _http
+    # Per-attempt timeout is kept short so 3 attempts stay within the request budget
+    _http = httpx.AsyncClient(timeout=5.0)
+
+async def close_sms_client() -> None:
+    """Close the SMSINDIAHUB HTTP client and its connection pool; called on app shutdown"""
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
 def generate_otp():
     """Generate a 6-digit OTP"""
     return str(random.randint(100000, 999999))
 
-@router.post("/send")
-@limiter.limit("5/minute")
-async def send_otp(request: Request, otp_request: SendOTPRequest):
-    """Send OTP to phone number using 2Factor API"""
+@_sms_breaker
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=0.25, max=2.0),
+    retry=retry_if_exception_type((httpx.TransportError, httpx.HTTPStatusError)),
+    reraise=True,
+)
+async def _post_sms(params: dict) -> httpx.Response:
+    """Call SMSINDIAHUB, retrying connection errors and 5xx responses with jittered backoff"""
+    response = await _http.get(SMSINDIAHUB_URL, params=params)
+    if response.status_code >= 500:
+        response.raise_for_status()
+    return response
+
+async def _send_otp_impl(phone: str) -> dict:
+    """Validate the phone, send a fresh OTP and store it; shared by /send and /resend"""
     try:
-        phone = otp_request.phone.strip()
-        
-        # Validate phone number (basic validation)
-        if not phone or len(phone) < 10:
+        # Validate phone number
+        if not _PHONE_RE.match(phone):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid phone number"
@@ -54,21 +111,12 @@ async def send_otp(request: Request, otp_request: SendOTPRequest):
         message = f"Welcome to the xyz powered by SMSINDIAHUB. Your OTP for registration is {otp}"
         
         # Send OTP via SMSINDIAHUB API
-        api_url = "http://cloud.smsindiahub.in/vendorsms/pushsms.aspx"
-        params = {
-            "APIKey": SMSINDIAHUB_API_KEY,
-            "msisdn": phone,
-            "sid": SMSINDIAHUB_SENDER_ID,
-            "msg": message,
-            "fl": "0",
-            "gwid": SMSINDIAHUB_GATEWAY_ID
-        }
+        params = {**_SMS_PARAMS_BASE, "msisdn": phone, "msg": message}
         
         try:
-            response = requests.get(api_url, params=params, timeout=10)
+            response = await _post_sms(params)
             
-            # Log response for debugging
-            print(f"SMSINDIAHUB Response: {response.text}")
+            logger.debug(f"SMSINDIAHUB response: {response.text}")
             
             # Parse JSON response
             try:
@@ -90,7 +138,12 @@ async def send_otp(request: Request, otp_request: SendOTPRequest):
                         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                         detail=f"OTP error: {response.text}"
                     )
-        except requests.exceptions.RequestException as e:
+        except CircuitBreakerError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="SMS provider unavailable, try later"
+            )
+        except httpx.HTTPError as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to send OTP: {str(e)}"
@@ -117,6 +170,40 @@ async def send_otp(request: Request, otp_request: SendOTPRequest):
             detail=f"Error sending OTP: {str(e)}"
         )
 
+@router.post("/send")
+@limiter.limit("5/minute")
+async def send_otp(request: Request, otp_request: SendOTPRequest):
+    """Send OTP to phone number using SMSINDIAHUB"""
+    return await _send_otp_impl(otp_request.phone.strip())
+
+def _check_otp(phone: str, otp: str) -> tuple:
+    """
+    Check an OTP and update its attempt counter in one step.
+    Returns (status, attempts_remaining) where status is one of
+    "none", "expired", "ok", "locked" or "bad". There is no await in here,
+    so concurrent verifies for the same phone can't interleave.
+    """
+    stored_data = otp_storage.get(phone)
+    if stored_data is None:
+        return "none", 0
+    
+    if datetime.now() > stored_data["expiry"]:
+        del otp_storage[phone]
+        return "expired", 0
+    
+    # Every wrong guess is answered with "bad"; the attempt after the last one is refused
+    if stored_data["attempts"] >= OTP_MAX_ATTEMPTS:
+        del otp_storage[phone]
+        return "locked", 0
+    
+    # Constant-time compare so response timing doesn't reveal matching digits
+    if hmac.compare_digest(stored_data["otp"].encode(), otp.encode()):
+        del otp_storage[phone]
+        return "ok", 0
+    
+    stored_data["attempts"] += 1
+    return "bad", OTP_MAX_ATTEMPTS - stored_data["attempts"]
+
 @router.post("/verify")
 @limiter.limit("10/minute")
 async def verify_otp(request: Request, verify_request: VerifyOTPRequest):
@@ -125,42 +212,14 @@ async def verify_otp(request: Request, verify_request: VerifyOTPRequest):
         phone = verify_request.phone.strip()
         otp = verify_request.otp.strip()
         
-        # Check if OTP exists for this phone
-        if phone not in otp_storage:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="No OTP found for this phone number. Please request a new OTP."
-            )
-        
-        stored_data = otp_storage[phone]
+        result, attempts_remaining = _check_otp(phone, otp)
         
-        # Check if OTP has expired
-        if datetime.now() > stored_data["expiry"]:
-            del otp_storage[phone]
+        if result != "ok":
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="OTP has expired. Please request a new OTP."
+                detail=_OTP_ERRORS[result].format(attempts_remaining=attempts_remaining)
             )
         
-        # Check attempts
-        if stored_data["attempts"] >= 3:
-            del otp_storage[phone]
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Too many failed attempts. Please request a new OTP."
-            )
-        
-        # Verify OTP
-        if stored_data["otp"] != otp:
-            stored_data["attempts"] += 1
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid OTP. {3 - stored_data['attempts']} attempts remaining."
-            )
-        
-        # OTP verified successfully - remove from storage
-        del otp_storage[phone]
-        
         return {
             "message": "OTP verified successfully",
             "phone": phone,
@@ -179,9 +238,10 @@ async def verify_otp(request: Request, verify_request: VerifyOTPRequest):
 @limiter.limit("3/minute")
 async def resend_otp(request: Request, otp_request: SendOTPRequest):
     """Resend OTP to phone number"""
+    phone = otp_request.phone.strip()
+    
     # Clear existing OTP if any
-    if otp_request.phone.strip() in otp_storage:
-        del otp_storage[otp_request.phone.strip()]
+    otp_storage.pop(phone, None)
     
     # Send new OTP
-    return await send_otp(request, otp_request)
+    return await _send_otp_impl(phone)
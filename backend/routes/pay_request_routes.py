@@ -1,23 +1,32 @@
 from fastapi import APIRouter, HTTPException, Header
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, validator
 from typing import Optional
 from datetime import datetime
-from core.database import get_supabase_client
+from core.database import get_supabase_client, run_db
 from middleware.auth_middleware import verify_token
-from core.websocket_manager import manager
-import bcrypt
+from core.websocket_manager import manager, fire_and_forget
+from core.utils import verify_pin
+from core.cache import invalidate_link
+import asyncio
 
 router = APIRouter()
 
 class CreatePayRequest(BaseModel):
     merchant_id: str
     user_id: str
-    amount: float
+    # Fits pay_requests.amount DECIMAL(10, 2)
+    amount: float = Field(..., gt=0, le=99_999_999.99)
     description: Optional[str] = None
+    
+    @validator('amount')
+    def validate_amount(cls, v):
+        if round(v, 2) != v:
+            raise ValueError('Amount can have at most 2 decimal places')
+        return v
 
 class AcceptPayRequest(BaseModel):
     request_id: int
-    pin: str
+    pin: str = Field(..., pattern=r"^\d{4,6}$")
 
 @router.post("/pay-requests/create")
 async def create_pay_request(
@@ -33,22 +42,18 @@ async def create_pay_request(
     if not user_data or user_data.get("sub") != request.merchant_id:
         raise HTTPException(status_code=403, detail="Unauthorized")
     
-    if request.amount <= 0:
-        raise HTTPException(status_code=400, detail="Amount must be positive")
-    
     try:
         supabase = get_supabase_client()
         
         # Verify link exists and get current balance
-        link_result = supabase.table("merchant_user_links")\
-            .select("balance, store_name")\
-            .eq("merchant_id", request.merchant_id)\
-            .eq("user_id", request.user_id)\
-            .eq("status", "active")\
-            .execute()
+        link_result = await run_db(lambda: supabase.table("merchant_user_links")
+            .select("balance")
+            .eq("merchant_id", request.merchant_id)
+            .eq("user_id", request.user_id)
+            .execute())
         
         if not link_result.data:
-            raise HTTPException(status_code=404, detail="Link not found or inactive")
+            raise HTTPException(status_code=404, detail="Link not found")
         
         balance = link_result.data[0]["balance"]
         
@@ -60,20 +65,20 @@ async def create_pay_request(
             )
         
         # Create pay request
-        pay_req_result = supabase.table("pay_requests").insert({
+        pay_req_result = await run_db(lambda: supabase.table("pay_requests").insert({
             "merchant_id": request.merchant_id,
             "user_id": request.user_id,
             "amount": request.amount,
             "description": request.description,
             "status": "pending"
-        }).execute()
+        }).execute())
         
         if not pay_req_result.data:
             raise HTTPException(status_code=500, detail="Failed to create pay request")
         
         # Broadcast to user via WebSocket if connected
         if manager.is_user_connected(request.user_id):
-            await manager.broadcast_payment_request_to_user(
+            fire_and_forget(manager.broadcast_payment_request_to_user(
                 request.user_id,
                 {
                     "request_id": pay_req_result.data[0]["id"],
@@ -82,7 +87,7 @@ async def create_pay_request(
                     "description": request.description,
                     "timestamp": datetime.utcnow().isoformat()
                 }
-            )
+            ))
         
         return {
             "message": "Pay request sent successfully",
@@ -113,14 +118,14 @@ async def get_user_pay_requests(
     try:
         supabase = get_supabase_client()
         
-        result = supabase.table("pay_requests")\
+        result = await run_db(lambda: supabase.table("pay_requests")
             .select(
                 "id, merchant_id, amount, description, status, created_at, responded_at, "
                 "merchants(store_name)"
-            )\
-            .eq("user_id", user_id)\
-            .order("created_at", desc=True)\
-            .execute()
+            )
+            .eq("user_id", user_id)
+            .order("created_at", desc=True)
+            .execute())
         
         requests = []
         for r in result.data:
@@ -158,14 +163,14 @@ async def get_merchant_pay_requests(
     try:
         supabase = get_supabase_client()
         
-        result = supabase.table("pay_requests")\
+        result = await run_db(lambda: supabase.table("pay_requests")
             .select(
                 "id, user_id, amount, description, status, created_at, responded_at, "
                 "merchant_user_links(user_name)"
-            )\
-            .eq("merchant_id", merchant_id)\
-            .order("created_at", desc=True)\
-            .execute()
+            )
+            .eq("merchant_id", merchant_id)
+            .order("created_at", desc=True)
+            .execute())
         
         requests = []
         for r in result.data:
@@ -204,10 +209,10 @@ async def accept_pay_request(
         supabase = get_supabase_client()
         
         # Get pay request details
-        pay_req_result = supabase.table("pay_requests")\
-            .select("*")\
-            .eq("id", request.request_id)\
-            .execute()
+        pay_req_result = await run_db(lambda: supabase.table("pay_requests")
+            .select("merchant_id, user_id, amount, status")
+            .eq("id", request.request_id)
+            .execute())
         
         if not pay_req_result.data:
             raise HTTPException(status_code=404, detail="Pay request not found")
@@ -222,11 +227,11 @@ async def accept_pay_request(
             raise HTTPException(status_code=400, detail=f"Request already {pay_req['status']}")
         
         # Get link and verify PIN
-        link_result = supabase.table("merchant_user_links")\
-            .select("pin_hash, balance, store_name, user_name")\
-            .eq("merchant_id", pay_req["merchant_id"])\
-            .eq("user_id", pay_req["user_id"])\
-            .execute()
+        link_result = await run_db(lambda: supabase.table("merchant_user_links")
+            .select("pin")
+            .eq("merchant_id", pay_req["merchant_id"])
+            .eq("user_id", pay_req["user_id"])
+            .execute())
         
         if not link_result.data:
             raise HTTPException(status_code=404, detail="Link not found")
@@ -234,45 +239,43 @@ async def accept_pay_request(
         link = link_result.data[0]
         
         # Verify PIN
-        if not bcrypt.checkpw(request.pin.encode('utf-8'), link["pin_hash"].encode('utf-8')):
+        if not await asyncio.to_thread(verify_pin, request.pin, link["pin"]):
             raise HTTPException(status_code=401, detail="Invalid PIN")
         
-        # Check balance
-        if link["balance"] < pay_req["amount"]:
+        # Check the balance and debit it on the locked link row, recording the transaction
+        # in the same call, so two accepts can't both spend the same balance
+        result = await run_db(lambda: supabase.rpc("apply_link_transaction", {
+            "p_merchant_id": pay_req["merchant_id"],
+            "p_user_id": pay_req["user_id"],
+            "p_amount": pay_req["amount"],
+            "p_transaction_type": "debit",
+            "p_allow_overdraft": False
+        }).execute())
+        
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Link not found")
+        
+        if result.data.get("insufficient_funds"):
             raise HTTPException(
                 status_code=400,
-                detail=f"Insufficient balance. Available: ₹{link['balance']:.2f}"
+                detail=f"Insufficient balance. Available: ₹{float(result.data['balance']):.2f}"
             )
         
-        # Deduct balance
-        new_balance = link["balance"] - pay_req["amount"]
-        supabase.table("merchant_user_links")\
-            .update({"balance": new_balance})\
-            .eq("merchant_id", pay_req["merchant_id"])\
-            .eq("user_id", pay_req["user_id"])\
-            .execute()
+        new_balance = float(result.data["balance_after"])
+        invalidate_link(pay_req["merchant_id"], pay_req["user_id"])
         
         # Update pay request status
-        supabase.table("pay_requests")\
+        await run_db(lambda: supabase.table("pay_requests")
             .update({
                 "status": "accepted",
                 "responded_at": datetime.utcnow().isoformat()
-            })\
-            .eq("id", request.request_id)\
-            .execute()
-        
-        # Create transaction record
-        supabase.table("transactions").insert({
-            "merchant_id": pay_req["merchant_id"],
-            "user_id": pay_req["user_id"],
-            "amount": pay_req["amount"],
-            "transaction_type": "purchase",
-            "store_name": link["store_name"]
-        }).execute()
+            }, returning="minimal")
+            .eq("id", request.request_id)
+            .execute())
         
         # Broadcast to merchant via WebSocket if connected
         if manager.is_merchant_connected(pay_req["merchant_id"]):
-            await manager.broadcast_payment_to_merchant(
+            fire_and_forget(manager.broadcast_payment_to_merchant(
                 pay_req["merchant_id"],
                 {
                     "user_id": pay_req["user_id"],
@@ -280,13 +283,12 @@ async def accept_pay_request(
                     "remaining_balance": new_balance,
                     "timestamp": datetime.utcnow().isoformat()
                 }
-            )
+            ))
         
         return {
             "message": "Payment successful",
             "amount": pay_req["amount"],
-            "new_balance": new_balance,
-            "store_name": link["store_name"]
+            "new_balance": new_balance
         }
         
     except HTTPException:
@@ -312,10 +314,10 @@ async def reject_pay_request(
         supabase = get_supabase_client()
         
         # Get pay request
-        pay_req_result = supabase.table("pay_requests")\
-            .select("user_id, status")\
-            .eq("id", request_id)\
-            .execute()
+        pay_req_result = await run_db(lambda: supabase.table("pay_requests")
+            .select("user_id, status")
+            .eq("id", request_id)
+            .execute())
         
         if not pay_req_result.data:
             raise HTTPException(status_code=404, detail="Pay request not found")
@@ -329,13 +331,13 @@ async def reject_pay_request(
             raise HTTPException(status_code=400, detail=f"Request already {pay_req['status']}")
         
         # Update status
-        supabase.table("pay_requests")\
+        await run_db(lambda: supabase.table("pay_requests")
             .update({
                 "status": "rejected",
                 "responded_at": datetime.utcnow().isoformat()
-            })\
-            .eq("id", request_id)\
-            .execute()
+            }, returning="minimal")
+            .eq("id", request_id)
+            .execute())
         
         return {"message": "Pay request rejected"}
         
@@ -1,18 +1,40 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Request
-from core.database import get_supabase_client
-from core.models import MerchantUserLink, AddBalance, ProcessTransaction, TransactionResponse
-from core.utils import hash_password, verify_password, verify_pin
+from core.database import get_supabase_client, is_unique_violation, run_db
+from core.models import (
+    MerchantUserLink, AddBalance, ProcessTransaction, PurchaseTransaction, PurchaseAuthorization, TransactionResponse,
+    BalanceResponse, AddBalanceResponse, PurchaseResponse, PinTokenResponse
+)
+from core.utils import hash_password, verify_password, verify_pin, create_pin_token, verify_pin_token
 from middleware.auth_middleware import get_current_user
 from datetime import datetime, timezone, timedelta
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from core.rate_limit import limiter
 from core.websocket_manager import manager
+from core.cache import get_cached, set_cached, invalidate_link
+from core.config import get_settings
+from postgrest.exceptions import APIError
+import asyncio
 
-limiter = Limiter(key_func=get_remote_address)
 
 router = APIRouter(prefix="/link", tags=["Merchant-User Link"])
 
 
+async def _check_user_pin(user_id: str, pin: str) -> None:
+    """Raise unless the PIN matches the one stored on the user"""
+    supabase = get_supabase_client()
+    user = await run_db(lambda: supabase.table("users").select("pin").eq("id", user_id).execute())
+    if not user.data or not user.data[0].get("pin"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User PIN not found"
+        )
+    
+    if not await asyncio.to_thread(verify_pin, pin, user.data[0]["pin"]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid PIN"
+        )
+
+
 @router.post("/create", response_model=dict, status_code=status.HTTP_201_CREATED)
 @limiter.limit("10/minute")
 async def create_link(request: Request, link_data: MerchantUserLink, current_user: dict = Depends(get_current_user)):
@@ -20,16 +42,20 @@ async def create_link(request: Request, link_data: MerchantUserLink, current_use
     try:
         supabase = get_supabase_client()
         
+        # Look up the merchant and the user's PIN concurrently
+        merchant, user = await asyncio.gather(
+            run_db(lambda: supabase.table("merchants").select("id").eq("id", link_data.merchant_id).limit(1).execute()),
+            run_db(lambda: supabase.table("users").select("profile_completed, pin").eq("id", link_data.user_id).execute())
+        )
+        
         # Verify merchant exists
-        merchant = supabase.table("merchants").select("*").eq("id", link_data.merchant_id).execute()
         if not merchant.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Merchant not found"
             )
         
-        # Verify user exists and get PIN
-        user = supabase.table("users").select("*").eq("id", link_data.user_id).execute()
+        # Verify user exists
         if not user.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -52,29 +78,27 @@ async def create_link(request: Request, link_data: MerchantUserLink, current_use
                 detail="User PIN not found. Please complete your profile first."
             )
         
-        if not verify_pin(link_data.pin, user_data["pin"]):
+        if not await asyncio.to_thread(verify_pin, link_data.pin, user_data["pin"]):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid PIN"
             )
         
-        # Check if link already exists
-        existing_link = supabase.table("merchant_user_links").select("*").eq(
-            "merchant_id", link_data.merchant_id
-        ).eq("user_id", link_data.user_id).execute()
-        
-        if existing_link.data:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Link already exists between this merchant and user"
-            )
-        
-        # Create link without storing PIN (PIN is in users table)
-        result = supabase.table("merchant_user_links").insert({
-            "merchant_id": link_data.merchant_id,
-            "user_id": link_data.user_id,
-            "balance": 0.0
-        }).execute()
+        # Create link without storing PIN (PIN is in users table).
+        # UNIQUE(merchant_id, user_id) rejects a second link for the same pair
+        try:
+            result = await run_db(lambda: supabase.table("merchant_user_links").insert({
+                "merchant_id": link_data.merchant_id,
+                "user_id": link_data.user_id,
+                "balance": 0.0
+            }).execute())
+        except APIError as e:
+            if is_unique_violation(e, "merchant_id, user_id"):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Link already exists between this merchant and user"
+                )
+            raise
         
         if not result.data:
             raise HTTPException(
@@ -82,6 +106,8 @@ async def create_link(request: Request, link_data: MerchantUserLink, current_use
                 detail="Failed to create link"
             )
         
+        invalidate_link(link_data.merchant_id, link_data.user_id)
+        
         return {
             "message": "Link created successfully",
             "link_id": result.data[0]["id"],
@@ -106,44 +132,20 @@ async def delink_merchant(request: Request, link_data: ProcessTransaction, curre
     try:
         supabase = get_supabase_client()
         
-        # Get the link
-        link = supabase.table("merchant_user_links").select("*").eq(
+        await _check_user_pin(link_data.user_id, link_data.pin)
+        
+        # Delete the link; no rows back means there was none
+        delete_result = await run_db(lambda: supabase.table("merchant_user_links").delete().eq(
             "merchant_id", link_data.merchant_id
-        ).eq("user_id", link_data.user_id).execute()
+        ).eq("user_id", link_data.user_id).execute())
         
-        if not link.data:
+        if not delete_result.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No link found between this merchant and user"
             )
         
-        link_record = link.data[0]
-        
-        # Get user's PIN from users table
-        user = supabase.table("users").select("pin").eq("id", link_data.user_id).execute()
-        if not user.data or not user.data[0].get("pin"):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User PIN not found"
-            )
-        
-        # Verify PIN from users table
-        if not verify_pin(link_data.pin, user.data[0]["pin"]):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid PIN"
-            )
-        
-        # Delete the link
-        delete_result = supabase.table("merchant_user_links").delete().eq(
-            "id", link_record["id"]
-        ).execute()
-        
-        if not delete_result:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to delink"
-            )
+        invalidate_link(link_data.merchant_id, link_data.user_id)
         
         return {
             "message": "Successfully delinked",
@@ -160,54 +162,35 @@ async def delink_merchant(request: Request, link_data: ProcessTransaction, curre
         )
 
 
-@router.post("/add-balance", response_model=dict)
+@router.post("/add-balance", response_model=AddBalanceResponse)
 @limiter.limit("20/minute")
 async def add_balance(request: Request, balance_data: AddBalance, current_user: dict = Depends(get_current_user)):
     """Add balance to user account for a specific merchant"""
     try:
         supabase = get_supabase_client()
         
-        # Get the link
-        link = supabase.table("merchant_user_links").select("*").eq(
-            "merchant_id", balance_data.merchant_id
-        ).eq("user_id", balance_data.user_id).execute()
+        ist = timezone(timedelta(hours=5, minutes=30))
+        current_time_ist = datetime.now(ist).isoformat()
+        
+        # Lock the link, credit it and record the transaction in one call
+        result = await run_db(lambda: supabase.rpc("apply_link_transaction", {
+            "p_merchant_id": balance_data.merchant_id,
+            "p_user_id": balance_data.user_id,
+            "p_amount": balance_data.amount,
+            "p_transaction_type": "credit",
+            "p_created_at": current_time_ist
+        }).execute())
         
-        if not link.data:
+        if not result.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No link found between this merchant and user"
             )
         
-        link_data = link.data[0]
-        
-        current_balance = link_data["balance"]
-        new_balance = current_balance + balance_data.amount
-        
-
-        update_result = supabase.table("merchant_user_links").update({
-            "balance": new_balance
-        }).eq("id", link_data["id"]).execute()
-        
-        if not update_result.data:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to update balance"
-            )
-        
-        ist = timezone(timedelta(hours=5, minutes=30))
-        current_time_ist = datetime.now(ist).isoformat()
-        transaction = supabase.table("transactions").insert({
-            "merchant_id": balance_data.merchant_id,
-            "user_id": balance_data.user_id,
-            "amount": balance_data.amount,
-            "transaction_type": "credit",
-            "balance_after": new_balance,
-            "created_at": current_time_ist
-        }).execute()
-        
-        # Fetch user name for WebSocket broadcast
-        user_data = supabase.table("users").select("user_name").eq("id", balance_data.user_id).execute()
-        user_name = user_data.data[0]["user_name"] if user_data.data else "Customer"
+        new_balance = float(result.data["balance_after"])
+        transaction_id = result.data["transaction_id"]
+        user_name = result.data.get("user_name") or "Customer"
+        invalidate_link(balance_data.merchant_id, balance_data.user_id)
         
         # Broadcast to merchant via WebSocket if connected
         if manager.is_merchant_connected(balance_data.merchant_id):
@@ -218,19 +201,19 @@ async def add_balance(request: Request, balance_data: AddBalance, current_user:
                     "user_name": user_name,
                     "amount": balance_data.amount,
                     "new_balance": new_balance,
-                    "transaction_id": transaction.data[0]["id"] if transaction.data else None,
+                    "transaction_id": transaction_id,
                     "timestamp": current_time_ist
                 }
             )
         
-        return {
-            "message": "Balance added successfully",
-            "merchant_id": balance_data.merchant_id,
-            "user_id": balance_data.user_id,
-            "amount_added": balance_data.amount,
-            "new_balance": new_balance,
-            "transaction_id": transaction.data[0]["id"] if transaction.data else None
-        }
+        return AddBalanceResponse(
+            message="Balance added successfully",
+            merchant_id=balance_data.merchant_id,
+            user_id=balance_data.user_id,
+            amount_added=balance_data.amount,
+            new_balance=new_balance,
+            transaction_id=transaction_id
+        )
         
     except HTTPException:
         raise
@@ -241,73 +224,96 @@ async def add_balance(request: Request, balance_data: AddBalance, current_user:
         )
 
 
-@router.post("/purchase", response_model=dict)
+@router.post("/authorize", response_model=PinTokenResponse)
+@limiter.limit("10/minute")
+async def authorize_purchases(request: Request, auth_data: PurchaseAuthorization, current_user: dict = Depends(get_current_user)):
+    """Check the user's PIN and return a short-lived, single-use token for one /link/purchase"""
+    try:
+        if current_user.get("sub") != auth_data.merchant_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only the merchant can authorize purchases"
+            )
+        
+        await _check_user_pin(auth_data.user_id, auth_data.pin)
+        
+        return PinTokenResponse(
+            pin_token=create_pin_token(auth_data.merchant_id, auth_data.user_id, auth_data.amount),
+            expires_in=get_settings().PIN_TOKEN_EXPIRE_MINUTES * 60
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred: {str(e)}"
+        )
+
+
+@router.post("/purchase", response_model=PurchaseResponse)
 @limiter.limit("30/minute")
-async def process_purchase(request: Request, transaction_data: ProcessTransaction, current_user: dict = Depends(get_current_user)):
+async def process_purchase(request: Request, transaction_data: PurchaseTransaction, current_user: dict = Depends(get_current_user)):
     """Process a purchase transaction with PIN validation from users table"""
     try:
         supabase = get_supabase_client()
         
-        # Get the link
-        link = supabase.table("merchant_user_links").select("*").eq(
-            "merchant_id", transaction_data.merchant_id
-        ).eq("user_id", transaction_data.user_id).execute()
-        
-        if not link.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="No link found between this merchant and user"
+        if transaction_data.pin_token:
+            # PIN was checked by /link/authorize; the token must match this link, merchant and amount
+            token = verify_pin_token(
+                transaction_data.pin_token, transaction_data.merchant_id,
+                transaction_data.user_id, transaction_data.amount
             )
-        
-        link_data = link.data[0]
-        
-        # Get user's PIN from users table
-        user = supabase.table("users").select("pin").eq("id", transaction_data.user_id).execute()
-        if not user.data or not user.data[0].get("pin"):
+            if current_user.get("sub") != transaction_data.merchant_id or not token:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid or expired PIN token"
+                )
+            
+            # Spend the token; the jti primary key rejects a second use from any worker
+            try:
+                await run_db(lambda: supabase.table("used_pin_tokens").insert({
+                    "jti": token["jti"],
+                    "expires_at": datetime.fromtimestamp(token["exp"], timezone.utc).isoformat()
+                }, returning="minimal").execute())
+            except APIError as e:
+                if is_unique_violation(e, "jti"):
+                    raise HTTPException(
+                        status_code=status.HTTP_401_UNAUTHORIZED,
+                        detail="PIN token already used"
+                    )
+                raise
+        elif transaction_data.pin:
+            await _check_user_pin(transaction_data.user_id, transaction_data.pin)
+        else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User PIN not found"
+                detail="PIN or PIN token is required"
             )
         
-        # Verify PIN from users table
-        if not verify_pin(transaction_data.pin, user.data[0]["pin"]):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid PIN"
-            )
-        
-        # Allow negative balance - no balance check
-        current_balance = link_data["balance"]
-        
-        # Calculate new balance
-        new_balance = current_balance - transaction_data.amount
+        ist = timezone(timedelta(hours=5, minutes=30))
+        current_time_ist = datetime.now(ist).isoformat()
         
-        # Update balance
-        update_result = supabase.table("merchant_user_links").update({
-            "balance": new_balance
-        }).eq("id", link_data["id"]).execute()
+        # Lock the link, debit it and record the transaction in one call.
+        # Negative balances are allowed, so there is no balance check.
+        result = await run_db(lambda: supabase.rpc("apply_link_transaction", {
+            "p_merchant_id": transaction_data.merchant_id,
+            "p_user_id": transaction_data.user_id,
+            "p_amount": transaction_data.amount,
+            "p_transaction_type": "debit",
+            "p_created_at": current_time_ist
+        }).execute())
         
-        if not update_result.data:
+        if not result.data:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to process transaction"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No link found between this merchant and user"
             )
         
-        # Record transaction with IST timestamp
-        ist = timezone(timedelta(hours=5, minutes=30))
-        current_time_ist = datetime.now(ist).isoformat()
-        transaction = supabase.table("transactions").insert({
-            "merchant_id": transaction_data.merchant_id,
-            "user_id": transaction_data.user_id,
-            "amount": transaction_data.amount,
-            "transaction_type": "debit",
-            "balance_after": new_balance,
-            "created_at": current_time_ist
-        }).execute()
-        
-        # Fetch user name for WebSocket broadcast
-        user_data = supabase.table("users").select("user_name").eq("id", transaction_data.user_id).execute()
-        user_name = user_data.data[0]["user_name"] if user_data.data else "Customer"
+        new_balance = float(result.data["balance_after"])
+        transaction_id = result.data["transaction_id"]
+        user_name = result.data.get("user_name") or "Customer"
+        invalidate_link(transaction_data.merchant_id, transaction_data.user_id)
         
         # Broadcast to merchant via WebSocket if connected
         if manager.is_merchant_connected(transaction_data.merchant_id):
@@ -318,19 +324,19 @@ async def process_purchase(request: Request, transaction_data: ProcessTransactio
                     "user_name": user_name,
                     "amount": transaction_data.amount,
                     "remaining_balance": new_balance,
-                    "transaction_id": transaction.data[0]["id"] if transaction.data else None,
+                    "transaction_id": transaction_id,
                     "timestamp": current_time_ist
                 }
             )
         
-        return {
-            "message": "Purchase successful",
-            "merchant_id": transaction_data.merchant_id,
-            "user_id": transaction_data.user_id,
-            "amount_paid": transaction_data.amount,
-            "remaining_balance": new_balance,
-            "transaction_id": transaction.data[0]["id"] if transaction.data else None
-        }
+        return PurchaseResponse(
+            message="Purchase successful",
+            merchant_id=transaction_data.merchant_id,
+            user_id=transaction_data.user_id,
+            amount_paid=transaction_data.amount,
+            remaining_balance=new_balance,
+            transaction_id=transaction_id
+        )
         
     except HTTPException:
         raise
@@ -341,7 +347,7 @@ async def process_purchase(request: Request, transaction_data: ProcessTransactio
         )
 
 
-@router.get("/balance/{merchant_id}/{user_id}", response_model=dict)
+@router.get("/balance/{merchant_id}/{user_id}", response_model=BalanceResponse)
 async def get_balance(merchant_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
     """Get balance for a specific merchant-user link"""
     try:
@@ -353,11 +359,16 @@ async def get_balance(merchant_id: str, user_id: str, current_user: dict = Depen
                 detail="You do not have permission to view this balance"
             )
         
+        cache_group = ("link", merchant_id, user_id)
+        cached = get_cached(cache_group, ("balance",))
+        if cached is not None:
+            return cached
+        
         supabase = get_supabase_client()
         
-        link = supabase.table("merchant_user_links").select("balance").eq(
+        link = await run_db(lambda: supabase.table("merchant_user_links").select("balance").eq(
             "merchant_id", merchant_id
-        ).eq("user_id", user_id).execute()
+        ).eq("user_id", user_id).limit(1).execute())
         
         if not link.data:
             raise HTTPException(
@@ -365,11 +376,14 @@ async def get_balance(merchant_id: str, user_id: str, current_user: dict = Depen
                 detail="No link found between this merchant and user"
             )
         
-        return {
-            "merchant_id": merchant_id,
-            "user_id": user_id,
-            "balance": link.data[0]["balance"]
-        }
+        result = BalanceResponse(
+            merchant_id=merchant_id,
+            user_id=user_id,
+            balance=link.data[0]["balance"]
+        )
+        set_cached(cache_group, ("balance",), result)
+        
+        return result
         
     except HTTPException:
         raise
@@ -392,13 +406,21 @@ async def get_transactions(merchant_id: str, user_id: str, limit: int = 50, curr
                 detail="You do not have permission to view these transactions"
             )
         
+        cache_group = ("link", merchant_id, user_id)
+        cached = get_cached(cache_group, ("txns", limit))
+        if cached is not None:
+            return cached
+        
         supabase = get_supabase_client()
         
-        transactions = supabase.table("transactions").select("*").eq(
+        transactions = await run_db(lambda: supabase.table("transactions").select("*").eq(
             "merchant_id", merchant_id
-        ).eq("user_id", user_id).order("created_at", desc=True).limit(limit).execute()
+        ).eq("user_id", user_id).order("created_at", desc=True).limit(limit).execute())
         
-        return transactions.data if transactions.data else []
+        result = transactions.data if transactions.data else []
+        set_cached(cache_group, ("txns", limit), result)
+        
+        return result
         
     except Exception as e:
         raise HTTPException(
@@ -415,24 +437,26 @@ async def get_user_transactions(user_id: str, limit: int = 100, current_user: di
         from middleware.auth_middleware import verify_resource_ownership
         verify_resource_ownership(current_user, user_id)
         
+        cache_group = ("user", user_id)
+        cached = get_cached(cache_group, ("user_txns", limit))
+        if cached is not None:
+            return cached
+        
         supabase = get_supabase_client()
         
-        # Get all transactions for this user
-        transactions_response = supabase.table("transactions").select("*").eq(
+        # Get all transactions for this user, with the merchant's store name embedded
+        transactions_response = await run_db(lambda: supabase.table("transactions").select("*, merchants(store_name)").eq(
             "user_id", user_id
-        ).order("created_at", desc=True).limit(limit).execute()
+        ).order("created_at", desc=True).limit(limit).execute())
         
         transactions = transactions_response.data if transactions_response.data else []
         
-        # Enrich transactions with merchant store names
+        # Flatten the embedded merchant into store_name
         for txn in transactions:
-            merchant = supabase.table("merchants").select("store_name").eq(
-                "id", txn["merchant_id"]
-            ).execute()
-            if merchant.data:
-                txn["store_name"] = merchant.data[0]["store_name"]
-            else:
-                txn["store_name"] = "Unknown Merchant"
+            merchant = txn.pop("merchants", None)
+            txn["store_name"] = merchant["store_name"] if merchant else "Unknown Merchant"
+        
+        set_cached(cache_group, ("user_txns", limit), transactions)
         
         return transactions
         
@@ -453,22 +477,17 @@ async def get_merchant_transactions(merchant_id: str, limit: int = 100, current_
         
         supabase = get_supabase_client()
         
-        # Get all transactions for this merchant
-        transactions_response = supabase.table("transactions").select("*").eq(
+        # Get all transactions for this merchant, with the user's name embedded
+        transactions_response = await run_db(lambda: supabase.table("transactions").select("*, users(user_name)").eq(
             "merchant_id", merchant_id
-        ).order("created_at", desc=True).limit(limit).execute()
+        ).order("created_at", desc=True).limit(limit).execute())
         
         transactions = transactions_response.data if transactions_response.data else []
         
-        # Enrich transactions with user names
+        # Flatten the embedded user into user_name
         for txn in transactions:
-            user = supabase.table("users").select("user_name").eq(
-                "id", txn["user_id"]
-            ).execute()
-            if user.data:
-                txn["user_name"] = user.data[0]["user_name"]
-            else:
-                txn["user_name"] = "Unknown User"
+            user = txn.pop("users", None)
+            txn["user_name"] = user["user_name"] if user else "Unknown User"
         
         return transactions
         
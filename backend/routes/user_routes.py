@@ -1,51 +1,118 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from core.database import get_supabase_client
-from core.models import UserCreate, UserLogin, UserResponse, Token
-from core.utils import hash_password, verify_password, generate_user_id, create_access_token
-from datetime import timedelta
-from middleware.auth_middleware import get_current_user, verify_resource_ownership
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Response
+from core.database import get_supabase_client, is_unique_violation, run_db, users_table
+from core.models import UserCreate, UserLogin, UserResponse, Token, LoginResponse, Notification
+from core.utils import hash_password, verify_password, password_needs_rehash, create_access_token
+from datetime import datetime, timedelta
+from middleware.auth_middleware import (
+    get_current_user, verify_resource_ownership,
+    login_attempt_key, check_login_allowed, record_login_failure, clear_login_failures
+)
+from core.websocket_manager import manager, fire_and_forget
+from core.cache import get_cached, set_cached, invalidate_link, invalidate_user
 from google.oauth2 import id_token
 from google.auth.transport import requests
 from core.config import get_settings
-from pydantic import BaseModel
-from typing import Optional
+from postgrest.exceptions import APIError
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from cachetools import TTLCache
+import asyncio
+import base64
+import hashlib
+import logging
+import orjson
+import time
+
+logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
+# Attempts at inserting a user before giving up on generated ID collisions
+USER_ID_MAX_ATTEMPTS = 3
+
+# Shared transport for Google cert fetches; google-auth caches certs per session
+_google_request = requests.Request()
+
+# Verified Google ID token claims keyed by a hash of the raw token, so retried
+# link requests skip the RSA signature check
+_google_verify_cache: TTLCache = TTLCache(maxsize=1000, ttl=300)
+
+# Upper bound on notifications returned per page
+NOTIFICATIONS_MAX_LIMIT = 50
+
+# Verified against on unknown phone numbers so a miss costs the same as a hit
+_DUMMY_PASSWORD_HASH = hash_password("mewallet-timing-dummy")
+
 router = APIRouter(prefix="/user", tags=["User"])
 
 
+# Pydantic models for profile and credential updates
+class UserProfileUpdate(BaseModel):
+    user_name: Optional[str] = None
+    phone: Optional[str] = None
+    dob: Optional[str] = None
+
+
+class LinkGoogleRequest(BaseModel):
+    user_id: str = Field(..., min_length=1)
+    id_token: str = Field(..., min_length=1)
+
+
+class SetPasswordRequest(BaseModel):
+    user_id: str = Field(..., min_length=1)
+    password: str = Field(..., min_length=6, max_length=72)
+
+
+class UpdatePasswordRequest(BaseModel):
+    user_id: str = Field(..., min_length=1)
+    old_password: str = Field(..., min_length=1)
+    new_password: str = Field(..., min_length=6, max_length=72)
+
+
+def _verify_google_token_cached(id_token_str: str) -> dict:
+    """Verify a Google ID token, reusing the claims until the token expires"""
+    key = hashlib.blake2b(id_token_str.encode(), digest_size=16).digest()
+    
+    cached = _google_verify_cache.get(key)
+    if cached is not None:
+        google_data, exp = cached
+        if time.time() < exp:
+            return google_data
+        _google_verify_cache.pop(key, None)
+    
+    google_data = id_token.verify_oauth2_token(
+        id_token_str, _google_request, settings.GOOGLE_CLIENT_ID
+    )
+    _google_verify_cache[key] = (google_data, google_data.get("exp", 0))
+    
+    return google_data
+
+
 @router.post("/register", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def register_user(user: UserCreate):
     """Register a new user"""
     try:
-        supabase = get_supabase_client()
-        
-        # Generate unique user ID
-        user_id = generate_user_id()
+        # Hash password and PIN on worker threads so the event loop isn't blocked
+        hashed_password, hashed_pin = await asyncio.gather(
+            asyncio.to_thread(hash_password, user.user_passw),
+            asyncio.to_thread(hash_password, user.pin)
+        )
         
-        # Ensure ID is unique
-        while True:
-            check = supabase.table("users").select("*").eq("id", user_id).execute()
-            if not check.data:
+        # Insert user; the ID comes from the column default (see schemas/user_id_default.sql).
+        # The primary key rejects a colliding ID, so retry and let the default draw again
+        for attempt in range(USER_ID_MAX_ATTEMPTS):
+            try:
+                result = await run_db(lambda: users_table().insert({
+                    "user_name": user.user_name,
+                    "user_passw": hashed_password,
+                    "phone": user.phone,
+                    "pin": hashed_pin,
+                    "profile_completed": True  # Profile is complete during registration
+                }).execute())
                 break
-            user_id = generate_user_id()
-        
-        # Hash password
-        hashed_password = hash_password(user.user_passw)
-        
-        # Hash PIN
-        hashed_pin = hash_password(user.pin)
-        
-        # Insert user
-        result = supabase.table("users").insert({
-            "id": user_id,
-            "user_name": user.user_name,
-            "user_passw": hashed_password,
-            "phone": user.phone,
-            "pin": hashed_pin,
-            "profile_completed": True  # Profile is complete during registration
-        }).execute()
+            except APIError as e:
+                if not is_unique_violation(e, "id") or attempt == USER_ID_MAX_ATTEMPTS - 1:
+                    raise
         
         if not result.data:
             raise HTTPException(
@@ -53,6 +120,8 @@ async def register_user(user: UserCreate):
                 detail="Failed to create user account"
             )
         
+        user_id = result.data[0]["id"]
+        
         # Create access token
         access_token = create_access_token(
             data={"sub": user_id, "user_type": "user"},
@@ -76,16 +145,18 @@ async def register_user(user: UserCreate):
         )
 
 
-@router.post("/login", response_model=dict)
-async def login_user(user: UserLogin):
+@router.post("/login", response_model=LoginResponse)
+async def login_user(request: Request, user: UserLogin):
     """Login user"""
+    account_key = login_attempt_key(request, f"user:{user.phone}")
     try:
-        supabase = get_supabase_client()
+        check_login_allowed(account_key)
         
         # Find user by phone number
-        result = supabase.table("users").select("*").eq("phone", user.phone).execute()
+        result = await run_db(lambda: users_table().select("id, user_name, user_passw").eq("phone", user.phone).limit(1).execute())
         
         if not result.data:
+            await asyncio.to_thread(verify_password, user.user_passw, _DUMMY_PASSWORD_HASH)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials"
@@ -94,25 +165,33 @@ async def login_user(user: UserLogin):
         user_data = result.data[0]
         
         # Verify password
-        if not verify_password(user.user_passw, user_data["user_passw"]):
+        if not await asyncio.to_thread(verify_password, user.user_passw, user_data["user_passw"]):
+            record_login_failure(account_key)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials"
             )
         
+        clear_login_failures(account_key)
+        
+        # Upgrade legacy bcrypt hashes to Argon2id now that we know the password
+        if password_needs_rehash(user_data["user_passw"]):
+            new_hash = await asyncio.to_thread(hash_password, user.user_passw)
+            await run_db(lambda: users_table().update({"user_passw": new_hash}, returning="minimal").eq("id", user_data["id"]).execute())
+        
         # Create access token
         access_token = create_access_token(
             data={"sub": user_data["id"], "user_type": "user"},
             expires_delta=timedelta(minutes=30)
         )
         
-        return {
-            "message": "Login successful",
-            "user_id": user_data["id"],
-            "user_name": user_data["user_name"],
-            "access_token": access_token,
-            "token_type": "bearer"
-        }
+        return LoginResponse(
+            message="Login successful",
+            user_id=user_data["id"],
+            user_name=user_data["user_name"],
+            access_token=access_token,
+            token_type="bearer"
+        )
         
     except HTTPException:
         raise
@@ -124,33 +203,28 @@ async def login_user(user: UserLogin):
 
 
 @router.get("/linked-merchants/{user_id}", response_model=list)
-async def get_linked_merchants(user_id: str):
+async def get_linked_merchants(user_id: str, current_user: dict = Depends(get_current_user)):
     """Get all merchants linked to a user"""
     try:
+        verify_resource_ownership(current_user, user_id)
+        
+        cache_group = ("user", user_id)
+        cached = get_cached(cache_group, ("linked_merchants",))
+        if cached is not None:
+            return cached
+        
         supabase = get_supabase_client()
         
-        # Get all merchant-user links
-        result = supabase.table("merchant_user_links").select(
-            "*, merchants(store_name, phone)"
-        ).eq("user_id", user_id).execute()
+        # v_linked_merchants already returns rows in the response shape
+        result = await run_db(lambda: supabase.table("v_linked_merchants").select("*").eq("user_id", user_id).execute())
         
-        if not result.data:
-            return []
+        merchants = result.data or []
+        set_cached(cache_group, ("linked_merchants",), merchants)
         
-        # Format response
-        linked_merchants = []
-        for link in result.data:
-            linked_merchants.append({
-                "link_id": link["id"],
-                "merchant_id": link["merchant_id"],
-                "user_id": link["user_id"],
-                "store_name": link["merchants"]["store_name"] if link.get("merchants") else "Unknown",
-                "balance": link["balance"],
-                "created_at": link["created_at"]
-            })
-        
-        return linked_merchants
+        return merchants
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -163,9 +237,8 @@ async def get_user_profile_details(user_id: str, current_user: dict = Depends(ge
     """Get detailed user profile"""
     try:
         verify_resource_ownership(current_user, user_id)
-        supabase = get_supabase_client()
         
-        result = supabase.table("users").select("id, user_name, phone, dob, google_id, google_email, user_passw, created_at").eq("id", user_id).execute()
+        result = await run_db(lambda: users_table().select("id, user_name, phone, dob, google_id, google_email, user_passw, created_at").eq("id", user_id).execute())
         
         if not result.data:
             raise HTTPException(
@@ -192,14 +265,13 @@ async def get_user_profile_details(user_id: str, current_user: dict = Depends(ge
 
 
 @router.put("/profile/{user_id}", response_model=dict)
-async def update_user_profile(user_id: str, profile_data: dict, current_user: dict = Depends(get_current_user)):
+async def update_user_profile(user_id: str, profile_data: UserProfileUpdate, current_user: dict = Depends(get_current_user)):
     """Update user profile"""
     try:
         verify_resource_ownership(current_user, user_id)
-        supabase = get_supabase_client()
         
         # Get current user data to check existing fields
-        current_user_data = supabase.table("users").select("user_name, phone").eq("id", user_id).execute()
+        current_user_data = await run_db(lambda: users_table().select("user_name, phone").eq("id", user_id).execute())
         if not current_user_data.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -208,13 +280,7 @@ async def update_user_profile(user_id: str, profile_data: dict, current_user: di
         
         existing_user = current_user_data.data[0]
         
-        update_data = {}
-        if "user_name" in profile_data:
-            update_data["user_name"] = profile_data["user_name"]
-        if "phone" in profile_data:
-            update_data["phone"] = profile_data["phone"]
-        if "dob" in profile_data:
-            update_data["dob"] = profile_data["dob"]
+        update_data = profile_data.model_dump(exclude_unset=True)
         
         if not update_data:
             raise HTTPException(
@@ -230,7 +296,7 @@ async def update_user_profile(user_id: str, profile_data: dict, current_user: di
         if final_user_name and final_phone:
             update_data["profile_completed"] = True
         
-        result = supabase.table("users").update(update_data).eq("id", user_id).execute()
+        result = await run_db(lambda: users_table().update(update_data).eq("id", user_id).execute())
         
         if not result.data:
             raise HTTPException(
@@ -253,25 +319,17 @@ async def update_user_profile(user_id: str, profile_data: dict, current_user: di
 
 
 @router.post("/link-google", response_model=dict)
-async def link_google_to_user(link_data: dict, current_user: dict = Depends(get_current_user)):
+async def link_google_to_user(link_data: LinkGoogleRequest, current_user: dict = Depends(get_current_user)):
     """Link Google account to existing user"""
     try:
-        user_id = link_data.get("user_id")
-        id_token_str = link_data.get("id_token")
-        
-        if not user_id or not id_token_str:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="user_id and id_token are required"
-            )
+        user_id = link_data.user_id
+        id_token_str = link_data.id_token
         
         verify_resource_ownership(current_user, user_id)
         
         # Verify Google ID token
         try:
-            google_data = id_token.verify_oauth2_token(
-                id_token_str, requests.Request(), settings.GOOGLE_CLIENT_ID
-            )
+            google_data = await asyncio.to_thread(_verify_google_token_cached, id_token_str)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -281,21 +339,19 @@ async def link_google_to_user(link_data: dict, current_user: dict = Depends(get_
         google_id = google_data.get("sub")
         google_email = google_data.get("email")
         
-        supabase = get_supabase_client()
-        
         # Check if Google ID is already linked to another account
-        existing = supabase.table("users").select("*").eq("google_id", google_id).execute()
-        if existing.data and existing.data[0]["id"] != user_id:
+        existing = await run_db(lambda: users_table().select("id").eq("google_id", google_id).neq("id", user_id).limit(1).execute())
+        if existing.data:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="This Google account is already linked to another user"
             )
         
         # Link Google account
-        result = supabase.table("users").update({
+        result = await run_db(lambda: users_table().update({
             "google_id": google_id,
             "google_email": google_email
-        }).eq("id", user_id).execute()
+        }).eq("id", user_id).execute())
         
         if not result.data:
             raise HTTPException(
@@ -318,35 +374,21 @@ async def link_google_to_user(link_data: dict, current_user: dict = Depends(get_
 
 
 @router.post("/set-password", response_model=dict)
-async def set_user_password(password_data: dict, current_user: dict = Depends(get_current_user)):
+async def set_user_password(password_data: SetPasswordRequest, current_user: dict = Depends(get_current_user)):
     """Set or update user password for manual login"""
     try:
-        user_id = password_data.get("user_id")
-        password = password_data.get("password")
-        
-        if not user_id or not password:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="user_id and password are required"
-            )
-        
-        if len(password) < 6:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Password must be at least 6 characters"
-            )
+        user_id = password_data.user_id
+        password = password_data.password
         
         verify_resource_ownership(current_user, user_id)
         
-        supabase = get_supabase_client()
-        
         # Hash the password
-        hashed_password = hash_password(password)
+        hashed_password = await asyncio.to_thread(hash_password, password)
         
         # Update user password
-        result = supabase.table("users").update({
+        result = await run_db(lambda: users_table().update({
             "user_passw": hashed_password
-        }).eq("id", user_id).execute()
+        }).eq("id", user_id).execute())
         
         if not result.data:
             raise HTTPException(
@@ -368,31 +410,17 @@ async def set_user_password(password_data: dict, current_user: dict = Depends(ge
 
 
 @router.post("/update-password", response_model=dict)
-async def update_user_password(password_data: dict, current_user: dict = Depends(get_current_user)):
+async def update_user_password(password_data: UpdatePasswordRequest, current_user: dict = Depends(get_current_user)):
     """Update user password with old password verification"""
     try:
-        user_id = password_data.get("user_id")
-        old_password = password_data.get("old_password")
-        new_password = password_data.get("new_password")
-        
-        if not user_id or not old_password or not new_password:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="user_id, old_password, and new_password are required"
-            )
-        
-        if len(new_password) < 6:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="New password must be at least 6 characters"
-            )
+        user_id = password_data.user_id
+        old_password = password_data.old_password
+        new_password = password_data.new_password
         
         verify_resource_ownership(current_user, user_id)
         
-        supabase = get_supabase_client()
-        
         # Get current user data
-        result = supabase.table("users").select("user_passw").eq("id", user_id).execute()
+        result = await run_db(lambda: users_table().select("user_passw").eq("id", user_id).execute())
         
         if not result.data:
             raise HTTPException(
@@ -403,19 +431,19 @@ async def update_user_password(password_data: dict, current_user: dict = Depends
         current_password_hash = result.data[0].get("user_passw")
         
         # Verify old password
-        if not current_password_hash or not verify_password(old_password, current_password_hash):
+        if not current_password_hash or not await asyncio.to_thread(verify_password, old_password, current_password_hash):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Current password is incorrect"
             )
         
         # Hash the new password
-        hashed_password = hash_password(new_password)
+        hashed_password = await asyncio.to_thread(hash_password, new_password)
         
         # Update user password
-        update_result = supabase.table("users").update({
+        update_result = await run_db(lambda: users_table().update({
             "user_passw": hashed_password
-        }).eq("id", user_id).execute()
+        }).eq("id", user_id).execute())
         
         if not update_result.data:
             raise HTTPException(
@@ -444,7 +472,7 @@ async def delete_user_account(user_id: str, current_user: dict = Depends(get_cur
         supabase = get_supabase_client()
         
         # Check all merchant links for non-zero balances
-        links = supabase.table("merchant_user_links").select("balance, merchant_id, merchants(store_name)").eq("user_id", user_id).execute()
+        links = await run_db(lambda: supabase.table("merchant_user_links").select("balance, merchant_id, merchants(store_name)").eq("user_id", user_id).execute())
         
         if links.data:
             non_zero_balances = [link for link in links.data if link["balance"] != 0]
@@ -461,20 +489,21 @@ async def delete_user_account(user_id: str, current_user: dict = Depends(get_cur
                     detail=f"Cannot delete account. Please clear all balances first:\n" + "\n".join(details)
                 )
         
-        # Delete all transactions
-        supabase.table("transactions").delete().eq("user_id", user_id).execute()
-        
-        # Delete all balance requests
-        supabase.table("balance_requests").delete().eq("user_id", user_id).execute()
-        
-        # Delete all link requests
-        supabase.table("link_requests").delete().eq("user_id", user_id).execute()
+        # Delete transactions, balance requests, link requests and merchant-user links.
+        # None of these depend on each other, so run them concurrently on the DB pool.
+        await asyncio.gather(*(
+            run_db(
+                lambda table=table: supabase.table(table).delete().eq("user_id", user_id).execute()
+            )
+            for table in ("transactions", "balance_requests", "link_requests", "merchant_user_links")
+        ))
         
-        # Delete all merchant-user links
-        supabase.table("merchant_user_links").delete().eq("user_id", user_id).execute()
+        for link in links.data or []:
+            invalidate_link(link["merchant_id"], user_id)
+        invalidate_user(user_id)
         
-        # Delete user
-        result = supabase.table("users").delete().eq("id", user_id).execute()
+        # Delete user once nothing references it
+        result = await run_db(lambda: users_table().delete().eq("id", user_id).execute())
         
         if not result.data:
             raise HTTPException(
@@ -495,68 +524,119 @@ async def delete_user_account(user_id: str, current_user: dict = Depends(get_cur
         )
 
 
+def _encode_notification_cursor(reminder_date: str, reminder_id: int) -> str:
+    """Opaque, URL-safe cursor for the reminder a notifications page ended on"""
+    return base64.urlsafe_b64encode(orjson.dumps([reminder_date, reminder_id])).decode()
+
+
+def _decode_notification_cursor(cursor: str) -> tuple:
+    """(reminder_date, id) from a cursor; raises ValueError if it wasn't one of ours"""
+    try:
+        reminder_date, reminder_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(reminder_date, str) or not isinstance(reminder_id, int):
+        raise ValueError("Invalid cursor")
+    datetime.fromisoformat(reminder_date)
+    return reminder_date, reminder_id
+
+
 # Pydantic model for dismissing reminders
 class DismissReminder(BaseModel):
     status: str = "dismissed"
 
 
-@router.get("/notifications/{user_id}", response_model=list)
-async def get_user_notifications(user_id: str, current_user: dict = Depends(get_current_user)):
-    """Get all active reminders/notifications for a user"""
+@router.get("/notifications/{user_id}", response_model=List[Notification])
+async def get_user_notifications(
+    user_id: str,
+    response: Response,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get active reminders/notifications for a user, oldest first.
+    Without `limit` every active reminder is returned. With it, pages are keyed
+    on (reminder_date, id): pass the X-Next-Cursor header from the previous
+    response as `after` to fetch the next page.
+    """
     try:
         verify_resource_ownership(current_user, user_id)
         
-        supabase = get_supabase_client()
-        
-        print(f"NOTIFICATIONS API: Fetching notifications for user {user_id}")
+        if limit is not None:
+            limit = max(1, min(limit, NOTIFICATIONS_MAX_LIMIT))
         
-        # Get all active reminders for this user
-        # Note: Join with merchants table for store name, not merchant_user_links
-        result = supabase.table("reminders").select(
-            "*, merchants(store_name)"
-        ).eq("user_id", user_id).eq("status", "active").order("reminder_date", desc=False).execute()
+        after_date = after_id = None
+        if after:
+            try:
+                after_date, after_id = _decode_notification_cursor(after)
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid cursor"
+                )
         
-        print(f"NOTIFICATIONS API: Query result count: {len(result.data) if result.data else 0}")
-        if result.data:
-            print(f"NOTIFICATIONS API: First reminder: {result.data[0]}")
+        supabase = get_supabase_client()
         
-        if not result.data:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Fetching notifications for user {user_id}")
+        
+        # Active reminders for this user, with the store name from merchants
+        # and the current balance from the reminder's link in the same request
+        def reminders_query():
+            return supabase.table("reminders").select(
+                "*, merchants(store_name), merchant_user_links(balance)"
+            ).eq("user_id", user_id).eq("status", "active")
+        
+        rows = []
+        if after_date:
+            # Rest of the cursor's own reminder_date, then everything after it
+            same_date = reminders_query().eq("reminder_date", after_date).gt("id", after_id).order("id")
+            if limit is not None:
+                same_date = same_date.limit(limit)
+            rows = (await run_db(lambda: same_date.execute())).data or []
+        
+        if limit is None or len(rows) < limit:
+            later = reminders_query()
+            if after_date:
+                later = later.gt("reminder_date", after_date)
+            later = later.order("reminder_date").order("id")
+            if limit is not None:
+                later = later.limit(limit - len(rows))
+            rows += (await run_db(lambda: later.execute())).data or []
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Found {len(rows)} active reminders for user {user_id}")
+        
+        if not rows:
             return []
         
-        # Get the balance from merchant_user_links separately (only merchant_id and balance exist)
-        links_result = supabase.table("merchant_user_links").select(
-            "merchant_id, balance"
-        ).eq("user_id", user_id).execute()
-        
-        # Create a lookup dict for balances by merchant_id
-        balances = {link["merchant_id"]: link["balance"] 
-                   for link in links_result.data} if links_result.data else {}
+        if limit is not None and len(rows) == limit:
+            last = rows[-1]
+            response.headers["X-Next-Cursor"] = _encode_notification_cursor(last["reminder_date"], last["id"])
         
         # Format response
         notifications = []
-        for reminder in result.data:
-            print(f"NOTIFICATIONS API: Processing reminder {reminder['id']}")
+        for reminder in rows:
             merchant_id = reminder["merchant_id"]
             
-            notifications.append({
-                "id": reminder["id"],
-                "merchant_id": merchant_id,
-                "store_name": reminder["merchants"]["store_name"] if reminder.get("merchants") else "Unknown Store",
-                "balance": balances.get(merchant_id, 0),
-                "message": reminder["message"],
-                "reminder_date": reminder["reminder_date"],
-                "status": reminder["status"],
-                "created_at": reminder["created_at"],
-                "type": "payment_reminder"
-            })
-        
-        print(f"NOTIFICATIONS API: Returning {len(notifications)} notifications")
+            notifications.append(Notification(
+                id=reminder["id"],
+                merchant_id=merchant_id,
+                store_name=reminder["merchants"]["store_name"] if reminder.get("merchants") else "Unknown Store",
+                balance=reminder["merchant_user_links"]["balance"] if reminder.get("merchant_user_links") else 0,
+                message=reminder["message"],
+                reminder_date=reminder["reminder_date"],
+                status=reminder["status"],
+                created_at=reminder["created_at"]
+            ))
+        
         return notifications
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"NOTIFICATIONS API ERROR: {str(e)}")
+        logger.error(f"Error fetching notifications for user {user_id}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An error occurred: {str(e)}"
@@ -570,27 +650,17 @@ async def dismiss_notification(reminder_id: int, current_user: dict = Depends(ge
         user_id = current_user.get("sub")
         supabase = get_supabase_client()
         
-        # Verify reminder belongs to user
-        check_result = supabase.table("reminders").select("*").eq("id", reminder_id).eq("user_id", user_id).execute()
-        
-        if not check_result.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Notification not found or unauthorized"
-            )
-        
-        # Delete the reminder
-        result = supabase.table("reminders").delete().eq("id", reminder_id).execute()
+        # Delete the reminder; the user_id filter limits it to the caller's own reminders
+        result = await run_db(lambda: supabase.table("reminders").delete().eq("id", reminder_id).eq("user_id", user_id).execute())
         
         if not result.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail="Notification not found"
+                detail="Notification not found or unauthorized"
             )
         
-        # Send WebSocket notification to user
-        from core.websocket_manager import manager
-        await manager.broadcast_reminder_dismissed_to_user(user_id, reminder_id)
+        # Send WebSocket notification to user without holding up the response
+        fire_and_forget(manager.broadcast_reminder_dismissed_to_user(user_id, reminder_id))
         
         return {
             "message": "Notification deleted successfully"
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from core.websocket_manager import manager
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ws", tags=["WebSocket"])
 
+# Heartbeat reply, serialized once instead of on every ping
+_PONG = '{"type":"pong"}'
+
 @router.websocket("/connect/{user_type}/{user_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
@@ -21,19 +25,19 @@ async def websocket_endpoint(
     
     try:
         # Send connection success message
-        await websocket.send_json({
+        await websocket.send_text(orjson.dumps({
             "event": "connected",
             "message": f"{user_type.capitalize()} {user_id} connected successfully"
-        })
+        }).decode())
         
         # Keep connection alive and handle incoming messages
         while True:
             # Receive messages from client (heartbeat, etc.)
-            data = await websocket.receive_json()
+            data = orjson.loads(await websocket.receive_text())
             
             # Handle ping/pong for keeping connection alive
             if data.get("type") == "ping":
-                await websocket.send_json({"type": "pong"})
+                await websocket.send_text(_PONG)
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket, user_id, user_type)
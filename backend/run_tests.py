@@ -4,51 +4,64 @@ Quick test runner script for MEWallet backend tests
 import subprocess
 import sys
 
+import pytest
+
+
+def run_pytest(args):
+    """
+    Run pytest in a fresh interpreter, so code edited since the last run is
+    re-imported and no module state carries over between runs
+    """
+    return subprocess.run([sys.executable, "-m", "pytest", *args]).returncode
+
+
+def run_pytest_in_process(args):
+    """
+    Run pytest in this interpreter, skipping the interpreter and plugin start-up.
+    Modules imported by an earlier run are reused, not reloaded: after editing
+    app code, restart the menu (or use option 1) to test the new version.
+    """
+    return int(pytest.main(args))
+
 
 def run_all_tests():
-    """Run all tests with coverage"""
+    """Run all tests with coverage (in a subprocess so coverage sees every import)"""
     print("🧪 Running all tests with coverage...\n")
-    result = subprocess.run([
-        "pytest",
+    return run_pytest([
         "-v",
+        "-n", "auto",
+        "--dist", "loadfile",
         "--cov=.",
         "--cov-report=term-missing",
         "--cov-report=html"
     ])
-    return result.returncode
 
 
 def run_specific_tests(test_file):
     """Run specific test file"""
     print(f"🧪 Running tests in {test_file}...\n")
-    result = subprocess.run([
-        "pytest",
+    return run_pytest_in_process([
         f"tests/{test_file}",
         "-v"
     ])
-    return result.returncode
 
 
 def run_with_pdb():
-    """Run tests with debugger"""
+    """Run tests with debugger (in a subprocess so pdb state doesn't leak into the menu)"""
     print("🐛 Running tests with debugger...\n")
-    result = subprocess.run([
-        "pytest",
+    return run_pytest([
         "--pdb",
         "-v"
     ])
-    return result.returncode
 
 
 def run_last_failed():
     """Run only last failed tests"""
     print("🔄 Running last failed tests...\n")
-    result = subprocess.run([
-        "pytest",
+    return run_pytest_in_process([
         "--lf",
         "-v"
     ])
-    return result.returncode
 
 
 def show_coverage():
@@ -64,8 +77,8 @@ def show_coverage():
         print("❌ Coverage report not found. Run tests with coverage first.\n")
 
 
-def main():
-    """Main test runner menu"""
+def show_menu():
+    """Print the test runner menu"""
     print("=" * 50)
     print("MEWallet Backend Test Runner")
     print("=" * 50)
@@ -81,44 +94,52 @@ def main():
     print("9. Show coverage report")
     print("0. Exit")
     print("=" * 50)
-    
-    choice = input("\nEnter your choice (0-9): ").strip()
-    
-    if choice == "1":
-        exit_code = run_all_tests()
-    elif choice == "2":
-        exit_code = run_specific_tests("test_user_routes.py")
-    elif choice == "3":
-        exit_code = run_specific_tests("test_merchant_routes.py")
-    elif choice == "4":
-        exit_code = run_specific_tests("test_transaction_routes.py")
-    elif choice == "5":
-        exit_code = run_specific_tests("test_pay_request_routes.py")
-    elif choice == "6":
-        exit_code = run_specific_tests("test_oauth_routes.py")
-    elif choice == "7":
-        exit_code = run_with_pdb()
-    elif choice == "8":
-        exit_code = run_last_failed()
-    elif choice == "9":
-        show_coverage()
-        exit_code = 0
-    elif choice == "0":
-        print("👋 Goodbye!")
-        sys.exit(0)
-    else:
-        print("❌ Invalid choice!")
-        sys.exit(1)
-    
-    print("\n" + "=" * 50)
-    if exit_code == 0:
-        print("✅ Tests completed successfully!")
-    else:
-        print("❌ Some tests failed!")
-    print("=" * 50)
-    
-    sys.exit(exit_code)
 
 
+def main():
+    """
+    Main test runner menu.
+    Loops back to the menu after each run, so the in-process options keep
+    imports and plugins loaded between runs.
+    """
+    exit_code = 0
+    
+    while True:
+        show_menu()
+        choice = input("\nEnter your choice (0-9): ").strip()
+        
+        if choice == "1":
+            exit_code = run_all_tests()
+        elif choice == "2":
+            exit_code = run_specific_tests("test_user_routes.py")
+        elif choice == "3":
+            exit_code = run_specific_tests("test_merchant_routes.py")
+        elif choice == "4":
+            exit_code = run_specific_tests("test_transaction_routes.py")
+        elif choice == "5":
+            exit_code = run_specific_tests("test_pay_request_routes.py")
+        elif choice == "6":
+            exit_code = run_specific_tests("test_oauth_routes.py")
+        elif choice == "7":
+            exit_code = run_with_pdb()
+        elif choice == "8":
+            exit_code = run_last_failed()
+        elif choice == "9":
+            show_coverage()
+            continue
+        elif choice == "0":
+            print("👋 Goodbye!")
+            sys.exit(exit_code)
+        else:
+            print("❌ Invalid choice!")
+            continue
+        
+        print("\n" + "=" * 50)
+        if exit_code == 0:
+            print("✅ Tests completed successfully!")
+        else:
+            print("❌ Some tests failed!")
+        print("=" * 50 + "\n")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,66 @@
+-- Apply a credit or debit to a merchant-user link in one transaction:
+-- lock the link, update its balance and record the transaction row.
+-- Used by POST /link/add-balance, POST /link/purchase and POST /pay-requests/accept
+-- (one round-trip each)
+-- Returns NULL when no link exists between the merchant and user. With
+-- p_allow_overdraft = FALSE a debit larger than the balance changes nothing and
+-- returns {link_id, insufficient_funds: true, balance}; the check runs on the
+-- locked row, so concurrent debits can't both pass it.
+-- Run this in Supabase SQL Editor
+
+-- Replaces the earlier five-argument version
+DROP FUNCTION IF EXISTS apply_link_transaction(TEXT, TEXT, NUMERIC, TEXT, TIMESTAMPTZ);
+
+CREATE OR REPLACE FUNCTION apply_link_transaction(
+    p_merchant_id TEXT,
+    p_user_id TEXT,
+    p_amount NUMERIC,
+    p_transaction_type TEXT,
+    p_created_at TIMESTAMPTZ DEFAULT NOW(),
+    p_allow_overdraft BOOLEAN DEFAULT TRUE
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_link_id INT;
+    v_balance NUMERIC;
+    v_transaction_id INT;
+    v_user_name TEXT;
+BEGIN
+    SELECT id, balance INTO v_link_id, v_balance
+    FROM merchant_user_links
+    WHERE merchant_id = p_merchant_id AND user_id = p_user_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    IF p_transaction_type = 'debit' AND NOT p_allow_overdraft AND v_balance < p_amount THEN
+        RETURN jsonb_build_object(
+            'link_id', v_link_id,
+            'insufficient_funds', TRUE,
+            'balance', v_balance
+        );
+    END IF;
+
+    -- Purchases allow negative balances, so they skip the check above
+    v_balance := v_balance + CASE WHEN p_transaction_type = 'credit' THEN p_amount ELSE -p_amount END;
+
+    UPDATE merchant_user_links SET balance = v_balance WHERE id = v_link_id;
+
+    INSERT INTO transactions (merchant_id, user_id, amount, transaction_type, balance_after, created_at)
+    VALUES (p_merchant_id, p_user_id, p_amount, p_transaction_type, v_balance, p_created_at)
+    RETURNING id INTO v_transaction_id;
+
+    SELECT user_name INTO v_user_name FROM users WHERE id = p_user_id;
+
+    RETURN jsonb_build_object(
+        'link_id', v_link_id,
+        'balance_after', v_balance,
+        'transaction_id', v_transaction_id,
+        'user_name', v_user_name
+    );
+END;
+$$;
@@ -0,0 +1,15 @@
+-- View returning a user's linked merchants in the exact shape served by
+-- GET /user/linked-merchants/{user_id}, so the API needs no reshaping
+-- Run this in Supabase SQL Editor
+
+CREATE OR REPLACE VIEW v_linked_merchants
+WITH (security_invoker = true) AS
+SELECT
+    l.id AS link_id,
+    l.merchant_id,
+    l.user_id,
+    COALESCE(m.store_name, 'Unknown') AS store_name,
+    l.balance,
+    l.created_at
+FROM merchant_user_links l
+LEFT JOIN merchants m ON m.id = l.merchant_id;
@@ -0,0 +1,63 @@
+-- Helpers for the pytest fixtures in backend/tests/conftest.py
+-- Create and tear down the session's test user and merchant in one request each
+-- Run this in Supabase SQL Editor (test project only)
+
+-- Replaced by the signature below, which also seeds the user's phone and PIN
+DROP FUNCTION IF EXISTS create_test_fixtures(TEXT, TEXT, TEXT, TEXT, TEXT, TEXT, TEXT);
+
+CREATE OR REPLACE FUNCTION create_test_fixtures(
+    p_user_id TEXT,
+    p_user_name TEXT,
+    p_user_passw TEXT,
+    p_user_phone TEXT,
+    p_user_pin TEXT,
+    p_merchant_id TEXT,
+    p_store_name TEXT,
+    p_phone TEXT,
+    p_merchant_password TEXT
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_user JSONB;
+    v_merchant JSONB;
+BEGIN
+    INSERT INTO users (id, user_name, user_passw, phone, pin, profile_completed)
+    VALUES (p_user_id, p_user_name, p_user_passw, p_user_phone, p_user_pin, TRUE)
+    RETURNING to_jsonb(users.*) INTO v_user;
+
+    INSERT INTO merchants (id, store_name, phone, password)
+    VALUES (p_merchant_id, p_store_name, p_phone, p_merchant_password)
+    RETURNING to_jsonb(merchants.*) INTO v_merchant;
+
+    RETURN jsonb_build_object('user', v_user, 'merchant', v_merchant);
+END;
+$$;
+
+-- Remove everything a test created between the fixture user and merchant
+CREATE OR REPLACE FUNCTION cleanup_test_pair(p_merchant_id TEXT, p_user_id TEXT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM reminders WHERE merchant_id = p_merchant_id AND user_id = p_user_id;
+    DELETE FROM pay_requests WHERE merchant_id = p_merchant_id AND user_id = p_user_id;
+    DELETE FROM transactions WHERE merchant_id = p_merchant_id AND user_id = p_user_id;
+    DELETE FROM balance_requests WHERE merchant_id = p_merchant_id AND user_id = p_user_id;
+    DELETE FROM link_requests WHERE merchant_id = p_merchant_id AND user_id = p_user_id;
+    DELETE FROM merchant_user_links WHERE merchant_id = p_merchant_id AND user_id = p_user_id;
+END;
+$$;
+
+-- Remove the fixture user and merchant along with anything left between them
+CREATE OR REPLACE FUNCTION cleanup_test_fixtures(p_merchant_id TEXT, p_user_id TEXT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM cleanup_test_pair(p_merchant_id, p_user_id);
+    DELETE FROM merchants WHERE id = p_merchant_id;
+    DELETE FROM users WHERE id = p_user_id;
+END;
+$$;
@@ -0,0 +1,20 @@
+-- Composite indexes for the newest-first transaction history queries:
+--   GET /link/transactions/{merchant_id}/{user_id}
+--   GET /link/user-transactions/{user_id}
+--   GET /link/merchant-transactions/{merchant_id}
+-- Each one filters on the leading columns and reads created_at in index order,
+-- so the LIMIT stops the scan early instead of sorting every matching row.
+-- Run this in Supabase SQL Editor
+
+CREATE INDEX IF NOT EXISTS idx_transactions_link_created
+    ON transactions(merchant_id, user_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_user_created
+    ON transactions(user_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_merchant_created
+    ON transactions(merchant_id, created_at DESC);
+
+-- The single-column indexes from schema.sql are prefixes of the ones above
+DROP INDEX IF EXISTS idx_transactions_merchant;
+DROP INDEX IF EXISTS idx_transactions_user;
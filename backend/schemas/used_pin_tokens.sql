@@ -0,0 +1,12 @@
+-- IDs (jti) of PIN tokens from /link/authorize that have paid for a purchase.
+-- The primary key makes each token single-use across every API worker.
+-- Run this in Supabase SQL Editor
+
+CREATE TABLE IF NOT EXISTS used_pin_tokens (
+    jti TEXT PRIMARY KEY,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- Rows are only needed until the token would have expired anyway; prune with e.g.
+--   DELETE FROM used_pin_tokens WHERE expires_at < NOW();
+CREATE INDEX IF NOT EXISTS idx_used_pin_tokens_expires ON used_pin_tokens(expires_at);
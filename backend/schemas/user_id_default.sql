@@ -0,0 +1,13 @@
+-- Generate user IDs in the database so registration is a single INSERT
+-- Format: 'UR' + 6 uppercase hex digits, the same shape as merchant IDs ('MR' + 6)
+-- Run this in Supabase SQL Editor
+
+CREATE OR REPLACE FUNCTION generate_user_id()
+RETURNS TEXT
+LANGUAGE sql
+VOLATILE
+AS $$
+    SELECT 'UR' || UPPER(LPAD(TO_HEX(FLOOR(RANDOM() * 16777216)::INT), 6, '0'));
+$$;
+
+ALTER TABLE users ALTER COLUMN id SET DEFAULT generate_user_id();
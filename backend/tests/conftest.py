@@ -1,192 +1,430 @@
 import pytest
+import pytest_asyncio
+import asyncio
+import httpx
+import orjson
 import os
+import sys
+from contextlib import ExitStack
 from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
 import random
+from itertools import cycle
+from collections import defaultdict
 
-# Set testing environment
+# Set testing environment before the app is imported: with TESTING=True, the shared
+# limiter in core/rate_limit.py is built disabled and main skips the HTTP middleware
 os.environ["TESTING"] = "True"
 
+# Tests run against the in-memory FakeSupabaseClient unless SUPABASE_LIVE_TESTS=True,
+# in which case they use the real project configured in .env
+USE_FAKE_SUPABASE = os.environ.get("SUPABASE_LIVE_TESTS") != "True"
+
+if USE_FAKE_SUPABASE:
+    # Settings are still validated at import time, so supply placeholders
+    for key in ("SUPABASE_URL", "SUPABASE_ANON_KEY", "SUPABASE_SERVICE_ROLE_KEY", "SECRET_KEY",
+                "SMSINDIAHUB_API_KEY", "SMSINDIAHUB_SENDER_ID", "SMSINDIAHUB_GATEWAY_ID",
+                "GOOGLE_CLIENT_ID"):
+        os.environ.setdefault(key, "test")
+
+from passlib.context import CryptContext
+from core import utils
+
+# Argon2 at its production cost dominates register/login time. Tests swap in the
+# same schemes at the lowest Argon2 cost before anything hashes at import time.
+utils.pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__time_cost=1,
+    argon2__memory_cost=8,
+    argon2__parallelism=1,
+)
+
 from main import app
 from core.database import get_supabase_client
-from core.utils import hash_password
-from faker import Faker
+from core.utils import hash_password, create_access_token
+from core.cache import invalidate_link
+from middleware import auth_middleware
+from routes import oauth_routes
+from tests.fake_supabase import FakeSupabaseClient
 
-fake = Faker('en_IN')
+# pytest-xdist worker number ("gw3" -> 3), baked into generated IDs so that
+# parallel workers sharing one database never hand out the same ID
+_WORKER = int(os.environ.get("PYTEST_XDIST_WORKER", "gw0")[2:])
+
+# Fixture credentials, hashed once per session.
+# Salts differ per hash, but tests only ever verify against the matching plaintext.
+TEST_PASSWORD = "Test@1234"
+TEST_PIN = "1234"
+_HASHED_TEST_PW = hash_password(TEST_PASSWORD)
+_HASHED_TEST_PIN = hash_password(TEST_PIN)
+
+
+class FakePool:
+    """
+    Pre-generated Faker values handed out round-robin.
+    Faker is imported and its providers set up once, here, rather than
+    being called for every value a test needs.
+    """
+    
+    SIZE = 200
+    
+    def __init__(self, seed=None):
+        from faker import Faker
+        
+        fake = Faker('en_IN')
+        if seed is not None:
+            fake.seed_instance(seed)
+        
+        def values(factory):
+            return cycle(tuple(factory() for _ in range(self.SIZE)))
+        
+        self._companies = values(fake.company)
+        self._names = values(fake.name)
+        self._user_names = values(fake.user_name)
+        self._emails = values(fake.unique.email)
+        # Bare 10-digit mobile numbers, the format the phone validators accept
+        self._phones = values(lambda: fake.numerify("9#########"))
+        self._passwords = values(fake.password)
+        self._uuids = values(fake.uuid4)
+        self._addresses = values(fake.address)
+    
+    def next_company(self):
+        return next(self._companies)
+    
+    def next_name(self):
+        return next(self._names)
+    
+    def next_user_name(self):
+        return next(self._user_names)
+    
+    def next_email(self):
+        return next(self._emails)
+    
+    def next_phone(self):
+        return next(self._phones)
+    
+    def next_password(self):
+        return next(self._passwords)
+    
+    def next_uuid(self):
+        return next(self._uuids)
+    
+    def next_address(self):
+        return next(self._addresses)
+
+
+# The in-memory fake starts empty every session, so its runs can use a fixed seed.
+# Live runs stay unseeded so values never clash with rows left by earlier runs.
+DEFAULT_FAKER_SEED = 0xC0FFEE if USE_FAKE_SUPABASE else None
+
+
+@pytest.fixture(scope="session")
+def fake_pool():
+    """Shared FakePool; FAKER_SEED overrides the default seed"""
+    seed = os.environ.get("FAKER_SEED")
+    return FakePool(int(seed) if seed else DEFAULT_FAKER_SEED)
 
 
-# Disable rate limiting for all tests
 @pytest.fixture(scope="session", autouse=True)
-def disable_rate_limiting():
-    """Disable SlowAPI rate limiting during tests"""
-    # Mock the limiter to do nothing
-    with patch('slowapi.Limiter.limit', return_value=lambda func: func):
+def orjson_response_parsing():
+    """Decode response.json() in tests with orjson, matching the app's ORJSONResponse"""
+    with patch.object(httpx.Response, "json", lambda self, **kwargs: orjson.loads(self.content)):
         yield
 
 
 @pytest.fixture(scope="session")
-def client():
-    """Test client for making API requests"""
-    return TestClient(app)
+def client(supabase):
+    """
+    Test client for making API requests.
+    Entered as a context manager so one event loop (and one app lifespan)
+    serves the whole session instead of a new loop per request.
+    """
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """One event loop for the session, so async fixtures can be session-scoped"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest_asyncio.fixture(scope="session")
+async def async_client(supabase):
+    """
+    Async client calling the app in-process over httpx's ASGI transport.
+    Lets a test await several independent requests together with asyncio.gather.
+    """
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
 
 
 @pytest.fixture(scope="session")
 def supabase():
-    """Supabase client for database operations"""
-    return get_supabase_client()
+    """
+    Supabase client for database operations.
+    With the fake enabled, every module that imported get_supabase_client is
+    patched to return the same in-memory client, so routes and tests share it.
+    """
+    if not USE_FAKE_SUPABASE:
+        yield get_supabase_client()
+        return
+    
+    fake_client = FakeSupabaseClient()
+    with ExitStack() as stack:
+        for module in list(sys.modules.values()):
+            if getattr(module, "get_supabase_client", None) is get_supabase_client:
+                stack.enter_context(patch.object(module, "get_supabase_client", lambda: fake_client))
+        yield fake_client
 
 
-@pytest.fixture
-def test_user(supabase):
-    """Create a test user and return credentials"""
-    user_id = f"UR{random.randint(100000, 999999)}"
-    password = "Test@1234"
-    user_name = fake.name()
-    
-    user_data = {
-        "id": user_id,
-        "user_name": user_name,
-        "user_passw": hash_password(password)
-    }
+# Flush order for cleanup_queue: rows that reference users/merchants go first
+CLEANUP_TABLES = ("merchant_user_links", "users", "merchants")
+
+
+@pytest.fixture(scope="session")
+def cleanup_queue(supabase):
+    """
+    Table -> IDs of rows created by tests outside the session pair.
+    Deleted at the end of the session with one DELETE ... IN per table.
+    """
+    queue = defaultdict(list)
+    yield queue
     
-    try:
-        result = supabase.table("users").insert(user_data).execute()
-        
-        yield {
-            "user_id": user_id,
-            "password": password,
-            "user_name": user_name,
-            "data": result.data[0] if result.data else user_data
-        }
-    finally:
-        # Cleanup
-        try:
-            supabase.table("users").delete().eq("id", user_id).execute()
-        except:
-            pass
+    for table in CLEANUP_TABLES:
+        ids = queue.pop(table, None)
+        if ids:
+            supabase.table(table).delete().in_("id", ids).execute()
+    
+    assert not queue, f"No cleanup order for tables: {sorted(queue)}"
 
 
-@pytest.fixture
-def test_merchant(supabase):
-    """Create a test merchant and return credentials"""
-    merchant_id = f"MR{random.randint(100000, 999999)}"
-    password = "Test@1234"
-    phone = f"9{random.randint(100000000, 999999999)}"
-    store_name = fake.company()
-    
-    merchant_data = {
-        "id": merchant_id,
-        "store_name": store_name,
-        "phone": phone,
-        "password": hash_password(password)
-    }
+@pytest.fixture(scope="session")
+def test_pair(supabase, fake_pool):
+    """
+    Create the session's test user and merchant in a single RPC call.
+    Needs the helper functions from schemas/test_fixtures.sql.
+    """
+    password = TEST_PASSWORD
+    user_id = f"UR{_WORKER:02d}{random.randint(1000, 9999)}"
+    user_name = fake_pool.next_name()
+    # users.phone is UNIQUE; the leading 8 keeps it clear of the 9-prefixed Faker phones
+    user_phone = f"8{_WORKER:02d}{random.randint(1000000, 9999999)}"
+    merchant_id = f"MR{_WORKER:02d}{random.randint(1000, 9999)}"
+    phone = f"9{_WORKER:02d}{random.randint(1000000, 9999999)}"
+    store_name = fake_pool.next_company()
     
     try:
-        result = supabase.table("merchants").insert(merchant_data).execute()
+        result = supabase.rpc("create_test_fixtures", {
+            "p_user_id": user_id,
+            "p_user_name": user_name,
+            "p_user_passw": _HASHED_TEST_PW,
+            "p_user_phone": user_phone,
+            "p_user_pin": _HASHED_TEST_PIN,
+            "p_merchant_id": merchant_id,
+            "p_store_name": store_name,
+            "p_phone": phone,
+            "p_merchant_password": _HASHED_TEST_PW
+        }).execute()
         
         yield {
-            "merchant_id": merchant_id,
-            "password": password,
-            "phone": phone,
-            "store_name": store_name,
-            "data": result.data[0] if result.data else merchant_data
+            "user": {
+                "user_id": user_id,
+                "password": password,
+                "phone": user_phone,
+                "pin": TEST_PIN,
+                "user_name": user_name,
+                "data": result.data["user"]
+            },
+            "merchant": {
+                "merchant_id": merchant_id,
+                "password": password,
+                "phone": phone,
+                "store_name": store_name,
+                "data": result.data["merchant"]
+            }
         }
     finally:
         # Cleanup
         try:
-            supabase.table("merchants").delete().eq("id", merchant_id).execute()
+            supabase.rpc("cleanup_test_fixtures", {
+                "p_merchant_id": merchant_id,
+                "p_user_id": user_id
+            }).execute()
         except:
             pass
 
 
-@pytest.fixture
-def user_token(client, test_user):
-    """Get JWT token for test user"""
-    response = client.post("/user/login", json={
-        "user_id": test_user["user_id"],
-        "user_passw": test_user["password"]
-    })
+@pytest.fixture(scope="session")
+def test_user(test_pair):
+    """Test user credentials, shared across the session"""
+    return test_pair["user"]
+
+
+@pytest.fixture(scope="session")
+def test_merchant(test_pair):
+    """Test merchant credentials, shared across the session"""
+    return test_pair["merchant"]
+
+
+@pytest.fixture(autouse=True)
+def reset_login_failures():
+    """Forget failed logins so one test's lockout can't leak into the next"""
+    yield
+    auth_middleware._login_failures.clear()
+    auth_middleware._account_failures.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_test_pair(request):
+    """Delete rows a test created between the session user and merchant"""
+    yield
+    
+    # Only tests that touched the session pair can have left anything behind
+    if "test_pair" not in request.fixturenames:
+        return
+    
+    supabase = request.getfixturevalue("supabase")
+    pair = request.getfixturevalue("test_pair")
     
-    if response.status_code != 200:
-        pytest.fail(f"User login failed: {response.status_code} - {response.text}")
+    try:
+        supabase.rpc("cleanup_test_pair", {
+            "p_merchant_id": pair["merchant"]["merchant_id"],
+            "p_user_id": pair["user"]["user_id"]
+        }).execute()
+    except:
+        pass
     
-    return response.json()["access_token"]
+    # The cleanup bypassed the routes, so drop any reads they cached for the pair
+    invalidate_link(pair["merchant"]["merchant_id"], pair["user"]["user_id"])
+
+
+@pytest.fixture(scope="session")
+def user_token(test_user):
+    """JWT for the test user, signed directly instead of going through /user/login"""
+    return create_access_token(data={"sub": test_user["user_id"], "user_type": "user"})
+
+
+@pytest.fixture(scope="session")
+def merchant_token(test_merchant):
+    """JWT for the test merchant, signed directly instead of going through /merchant/login"""
+    return create_access_token(data={"sub": test_merchant["merchant_id"], "user_type": "merchant"})
+
+
+@pytest.fixture(scope="session")
+def unlinked_user(client, fake_pool, cleanup_queue):
+    """A second user with no merchant links, registered once per session"""
+    response = client.post("/user/register", json={
+        "user_name": fake_pool.next_user_name(),
+        "user_passw": TEST_PASSWORD,
+        "phone": fake_pool.next_phone(),
+        "pin": TEST_PIN
+    })
+    assert response.status_code == 201, response.text
+    data = response.json()
+    cleanup_queue["users"].append(data["user_id"])
+    return {"user_id": data["user_id"], "token": data["access_token"]}
 
 
 @pytest.fixture
-def merchant_token(client, test_merchant):
-    """Get JWT token for test merchant"""
-    response = client.post("/merchant/login", json={
-        "merchant_id": test_merchant["merchant_id"],
-        "merchant_passw": test_merchant["password"]
+def google_claims(request, fake_pool):
+    """
+    Claims returned by the mocked Google token verification.
+    Override per test with indirect parametrization to use different claims.
+    """
+    claims = {
+        'email': fake_pool.next_email(),
+        'name': fake_pool.next_name(),
+        'sub': fake_pool.next_uuid()
+    }
+    claims.update(getattr(request, "param", {}))
+    return claims
+
+
+def _oauth_session(client, google_claims, monkeypatch, cleanup_queue, user_type):
+    """Sign in through /oauth/google with token verification mocked out"""
+    monkeypatch.setattr(oauth_routes.id_token, "verify_oauth2_token",
+                        MagicMock(return_value=google_claims))
+    response = client.post("/oauth/google", json={
+        "id_token": "mock_token",
+        "user_type": user_type
     })
-    
-    if response.status_code != 200:
-        pytest.fail(f"Merchant login failed: {response.status_code} - {response.text}")
-    
-    return response.json()["access_token"]
+    assert response.status_code == 200, response.text
+    data = response.json()
+    cleanup_queue[f"{user_type}s"].append(data[f"{user_type}_id"])
+    return data[f"{user_type}_id"], data["access_token"]
+
+
+@pytest.fixture
+def oauth_merchant_session(client, google_claims, monkeypatch, cleanup_queue):
+    """(merchant_id, token) for a fresh merchant registered via Google OAuth"""
+    return _oauth_session(client, google_claims, monkeypatch, cleanup_queue, "merchant")
+
+
+@pytest.fixture
+def oauth_user_session(client, google_claims, monkeypatch, cleanup_queue):
+    """(user_id, token) for a fresh user registered via Google OAuth"""
+    return _oauth_session(client, google_claims, monkeypatch, cleanup_queue, "user")
 
 
 @pytest.fixture
 def test_link(supabase, test_user, test_merchant):
     """Create a link between test user and merchant"""
-    pin = "1234"
+    pin = TEST_PIN
     
     link_data = {
         "merchant_id": test_merchant["merchant_id"],
         "user_id": test_user["user_id"],
-        "pin": hash_password(pin),
+        "pin": _HASHED_TEST_PIN,
+        "balance": 1000.0
+    }
+    
+    # Removed by reset_test_pair after the test
+    result = supabase.table("merchant_user_links").insert(link_data).execute()
+    
+    return {
+        "link_id": result.data[0]["id"],
+        "pin": pin,
+        "merchant_id": test_merchant["merchant_id"],
+        "user_id": test_user["user_id"],
         "balance": 1000.0,
-        "status": "active"
+        "data": result.data[0]
     }
+
+
+@pytest.fixture
+def pay_request_factory(supabase, test_link):
+    """
+    Callable that inserts a pending pay request on test_link and returns its id.
+    Goes straight to the database, skipping the /pay-requests/create round-trip.
+    """
+    def make(amount=50.0, description="Test payment"):
+        # Removed by reset_test_pair after the test
+        result = supabase.table("pay_requests").insert({
+            "merchant_id": test_link["merchant_id"],
+            "user_id": test_link["user_id"],
+            "amount": amount,
+            "description": description,
+            "status": "pending"
+        }).execute()
+        return result.data[0]["id"]
     
-    result = None
-    try:
-        result = supabase.table("merchant_user_links").insert(link_data).execute()
-        
-        yield {
-            "link_id": result.data[0]["id"],
-            "pin": pin,
-            "merchant_id": test_merchant["merchant_id"],
-            "user_id": test_user["user_id"],
-            "balance": 1000.0,
-            "data": result.data[0]
-        }
-    finally:
-        # Cleanup
-        try:
-            if result and result.data:
-                supabase.table("merchant_user_links").delete().eq("id", result.data[0]["id"]).execute()
-        except:
-            pass
+    return make
 
 
 @pytest.fixture
-def test_pay_request(supabase, test_link):
+def test_pay_request(test_link, pay_request_factory):
     """Create a test pay request"""
-    request_data = {
+    request_id = pay_request_factory(amount=500.0, description="Test payment request")
+    
+    return {
+        "request_id": request_id,
         "merchant_id": test_link["merchant_id"],
         "user_id": test_link["user_id"],
-        "amount": 500.0,
-        "description": "Test payment request",
-        "status": "pending"
+        "amount": 500.0
     }
-    
-    result = None
-    try:
-        result = supabase.table("pay_requests").insert(request_data).execute()
-        
-        yield {
-            "request_id": result.data[0]["id"],
-            "merchant_id": test_link["merchant_id"],
-            "user_id": test_link["user_id"],
-            "amount": 500.0,
-            "data": result.data[0]
-        }
-    finally:
-        # Cleanup
-        try:
-            if result and result.data:
-                supabase.table("pay_requests").delete().eq("id", result.data[0]["id"]).execute()
-        except:
-            pass
\ No newline at end of file
@@ -0,0 +1,495 @@
+"""
+In-memory stand-in for the Supabase client used by the test suite.
+
+Query builders record PostgREST query params the same way postgrest-py does
+(eq -> "eq.value", order -> "order=col.desc", ...), and execute() evaluates
+them against Python lists, so route code runs unchanged without network I/O.
+"""
+import secrets
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import count
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from postgrest.exceptions import APIError
+
+# Tables keyed by a text ID the app generates; every other table gets a serial ID
+TEXT_ID_TABLES = {"users", "merchants"}
+
+
+def _default_user_id() -> str:
+    """Same format as the users.id default in schemas/user_id_default.sql: 'UR' + 6 uppercase hex digits"""
+    return f"UR{secrets.token_hex(3).upper()}"
+
+
+# Unique constraints checked on insert/update
+UNIQUE_KEYS = {
+    "users": [("id",), ("phone",)],
+    "merchants": [("id",), ("phone",)],
+    "merchant_user_links": [("id",), ("merchant_id", "user_id")],
+    "used_pin_tokens": [("jti",)],
+}
+
+# NUMERIC columns come back from PostgREST as numbers even when sent as strings
+NUMERIC_COLUMNS = {"amount", "balance", "balance_after"}
+
+# Foreign keys that don't follow the "<table>_id" naming used for embeds
+EMBED_KEYS = {
+    ("reminders", "merchant_user_links"): "link_id",
+}
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset"}
+
+
+class FakeResponse:
+    """Mirrors the data/count attributes of postgrest's APIResponse"""
+
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class FakeParams:
+    """Ordered list of query params with postgrest-py's immutable add() API"""
+
+    def __init__(self, items: Optional[List[Tuple[str, str]]] = None):
+        self.items = items or []
+
+    def add(self, key: str, value: Any) -> "FakeParams":
+        return FakeParams(self.items + [(key, str(value))])
+
+    def get(self, key: str) -> Optional[str]:
+        for k, v in self.items:
+            if k == key:
+                return v
+        return None
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split on commas that aren't nested inside parentheses or quotes"""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        if char == "," and depth == 0 and not quoted:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _cast(raw: str, current: Any) -> Any:
+    """Convert a PostgREST filter value to the type of the stored column value"""
+    raw = raw.strip('"')
+    if current is None or raw.lower() == "null":
+        return None if raw.lower() == "null" else raw
+    if isinstance(current, bool):
+        return raw.lower() == "true"
+    if isinstance(current, (int, float)):
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+    return raw
+
+
+def _compare(row_value: Any, op: str, raw: str) -> bool:
+    """Evaluate a single PostgREST operator against a row value"""
+    if op == "is":
+        target = raw.lower()
+        if target == "null":
+            return row_value is None
+        return row_value is (target == "true")
+    if op == "in":
+        options = [item.strip() for item in _split_top_level(raw.strip("()"))]
+        return any(row_value == _cast(option, row_value) for option in options)
+    if op in ("like", "ilike"):
+        if row_value is None:
+            return False
+        pattern = raw.strip('"').replace("*", "%")
+        text = str(row_value)
+        if op == "ilike":
+            pattern, text = pattern.lower(), text.lower()
+        prefix, _, suffix = pattern.partition("%")
+        if "%" not in pattern:
+            return text == pattern
+        return text.startswith(prefix) and text.endswith(suffix.replace("%", ""))
+
+    value = _cast(raw, row_value)
+    if op == "eq":
+        return row_value == value
+    if op == "neq":
+        return row_value != value
+    if row_value is None or value is None:
+        return False
+    if op == "gt":
+        return row_value > value
+    if op == "gte":
+        return row_value >= value
+    if op == "lt":
+        return row_value < value
+    if op == "lte":
+        return row_value <= value
+    raise NotImplementedError(f"Fake Supabase does not support operator '{op}'")
+
+
+def _matches(row: dict, key: str, expression: str) -> bool:
+    """Evaluate one query param (column filter or or/and group) against a row"""
+    if key in ("or", "and"):
+        terms = _split_top_level(expression.strip()[1:-1])
+        results = []
+        for term in terms:
+            if term.startswith(("or(", "and(")):
+                name, _, rest = term.partition("(")
+                results.append(_matches(row, name, "(" + rest))
+            else:
+                column, _, condition = term.partition(".")
+                results.append(_matches(row, column, condition))
+        return any(results) if key == "or" else all(results)
+
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, raw = expression.partition(".")
+    result = _compare(row.get(key), op, raw)
+    return not result if negate else result
+
+
+def _sort_key(value: Any) -> Tuple[bool, Any]:
+    """Sort NULLs last, like Postgres does for ascending order"""
+    return (value is None, value if value is not None else 0)
+
+
+class FakeQuery:
+    """Chainable query builder matching the postgrest-py methods the routes use"""
+
+    def __init__(self, client: "FakeSupabaseClient", table: str):
+        self.client = client
+        self.table = table
+        self.params = FakeParams()
+        self.method = "GET"
+        self.payload: Any = None
+        self.returns_single = False
+        self.returning = "representation"
+        self.count = None
+
+    # Verbs
+    def select(self, *columns: str, count: Optional[str] = None) -> "FakeQuery":
+        self.method = "GET"
+        self.params = self.params.add("select", ",".join(columns) or "*")
+        return self
+
+    def insert(self, data: Any, *, count: Optional[str] = None, returning: str = "representation", **kwargs) -> "FakeQuery":
+        self.method = "POST"
+        self.payload = data
+        self.count, self.returning = count, returning
+        return self
+
+    def update(self, data: dict, *, count: Optional[str] = None, returning: str = "representation") -> "FakeQuery":
+        self.method = "PATCH"
+        self.payload = data
+        self.count, self.returning = count, returning
+        return self
+
+    def delete(self, *, count: Optional[str] = None, returning: str = "representation") -> "FakeQuery":
+        self.method = "DELETE"
+        self.count, self.returning = count, returning
+        return self
+
+    # Filters
+    def _filter(self, column: str, expression: str) -> "FakeQuery":
+        self.params = self.params.add(column, expression)
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, f"eq.{value}")
+
+    def neq(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, f"neq.{value}")
+
+    def gt(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, f"gt.{value}")
+
+    def gte(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, f"gte.{value}")
+
+    def lt(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, f"lt.{value}")
+
+    def lte(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, f"lte.{value}")
+
+    def is_(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, f"is.{value}")
+
+    def like(self, column: str, pattern: str) -> "FakeQuery":
+        return self._filter(column, f"like.{pattern}")
+
+    def ilike(self, column: str, pattern: str) -> "FakeQuery":
+        return self._filter(column, f"ilike.{pattern}")
+
+    def in_(self, column: str, values: Any) -> "FakeQuery":
+        return self._filter(column, f"in.({','.join(str(v) for v in values)})")
+
+    # Modifiers
+    def order(self, column: str, *, desc: bool = False, **kwargs) -> "FakeQuery":
+        self.params = self.params.add("order", f"{column}{'.desc' if desc else ''}")
+        return self
+
+    def limit(self, size: int, **kwargs) -> "FakeQuery":
+        self.params = self.params.add("limit", size)
+        return self
+
+    def range(self, start: int, end: int) -> "FakeQuery":
+        self.params = self.params.add("offset", start).add("limit", end - start + 1)
+        return self
+
+    def single(self) -> "FakeQuery":
+        self.returns_single = True
+        return self
+
+    # Execution
+    def _filtered(self) -> List[dict]:
+        filters = [(k, v) for k, v in self.params.items if k not in RESERVED_PARAMS]
+        rows = self.client.rows(self.table)
+        return [row for row in rows if all(_matches(row, k, v) for k, v in filters)]
+
+    def execute(self) -> FakeResponse:
+        if self.method == "POST":
+            data = self.client.insert_rows(self.table, self.payload)
+        elif self.method == "PATCH":
+            rows = self._filtered()
+            self.client.update_rows(self.table, rows, self.payload)
+            data = [dict(row) for row in rows]
+        elif self.method == "DELETE":
+            rows = self._filtered()
+            self.client.delete_rows(self.table, rows)
+            data = [dict(row) for row in rows]
+        else:
+            data = self._select()
+
+        # Prefer: return=minimal sends an empty 204 body; postgrest-py fails to decode it
+        # and falls back to data=[], count=0 whether or not a count was requested
+        if self.returning == "minimal":
+            return FakeResponse([], 0)
+        if self.returns_single:
+            return FakeResponse(data[0] if data else None)
+        return FakeResponse(data, len(data))
+
+    def _select(self) -> List[dict]:
+        rows = self._filtered()
+
+        # Chained .order() calls each add an order param; earlier ones sort first
+        specs = [spec for key, value in self.params.items if key == "order" for spec in value.split(",")]
+        if specs:
+            for spec in reversed(specs):
+                column, _, direction = spec.partition(".")
+                rows = sorted(rows, key=lambda r: _sort_key(r.get(column)), reverse=direction == "desc")
+
+        offset = int(self.params.get("offset") or 0)
+        limit = self.params.get("limit")
+        rows = rows[offset:offset + int(limit)] if limit else rows[offset:]
+
+        return [self.client.project(self.table, row, self.params.get("select") or "*") for row in rows]
+
+
+class FakeRPC:
+    """Deferred call to a registered fake Postgres function"""
+
+    def __init__(self, handler: Callable[[dict], Any], params: dict):
+        self.handler = handler
+        self.params = params
+
+    def execute(self) -> FakeResponse:
+        return FakeResponse(self.handler(self.params))
+
+
+class FakeSupabaseClient:
+    """Dict-backed replacement for the supabase-py Client"""
+
+    def __init__(self):
+        self.tables: Dict[str, List[dict]] = defaultdict(list)
+        self._sequences: Dict[str, count] = defaultdict(lambda: count(1))
+        self.views: Dict[str, Callable[[], List[dict]]] = {
+            "v_linked_merchants": self._linked_merchants_view,
+        }
+        self.functions: Dict[str, Callable[[dict], Any]] = {
+            "create_test_fixtures": self._create_test_fixtures,
+            "cleanup_test_pair": self._cleanup_test_pair,
+            "cleanup_test_fixtures": self._cleanup_test_fixtures,
+            "apply_link_transaction": self._apply_link_transaction,
+        }
+
+    # supabase-py API
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Optional[dict] = None) -> FakeRPC:
+        if name not in self.functions:
+            raise APIError({"message": f"function {name} does not exist", "code": "42883"})
+        return FakeRPC(self.functions[name], params or {})
+
+    # Storage
+    def rows(self, table: str) -> List[dict]:
+        if table in self.views:
+            return self.views[table]()
+        return self.tables[table]
+
+    def _normalize(self, row: dict) -> dict:
+        return {
+            key: float(value) if key in NUMERIC_COLUMNS and isinstance(value, str) else value
+            for key, value in row.items()
+        }
+
+    def _check_unique(self, table: str, row: dict, ignore: Optional[dict] = None):
+        for columns in UNIQUE_KEYS.get(table, []):
+            values = tuple(row.get(c) for c in columns)
+            if None in values:
+                continue
+            for existing in self.tables[table]:
+                if existing is not ignore and tuple(existing.get(c) for c in columns) == values:
+                    raise APIError({
+                        "message": f'duplicate key value violates unique constraint "{table}_{"_".join(columns)}_key"',
+                        "code": "23505",
+                        "details": f"Key ({', '.join(columns)})=({', '.join(map(str, values))}) already exists.",
+                        "hint": None,
+                    })
+
+    def insert_rows(self, table: str, payload: Any) -> List[dict]:
+        rows = payload if isinstance(payload, list) else [payload]
+        inserted = []
+        for data in rows:
+            row = self._normalize(dict(data))
+            if "id" not in row:
+                row["id"] = _default_user_id() if table == "users" else next(self._sequences[table])
+            row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+            self._check_unique(table, row)
+            self.tables[table].append(row)
+            inserted.append(dict(row))
+        return inserted
+
+    def update_rows(self, table: str, rows: List[dict], changes: dict):
+        changes = self._normalize(changes)
+        for row in rows:
+            self._check_unique(table, {**row, **changes}, ignore=row)
+            row.update(changes)
+
+    def delete_rows(self, table: str, rows: List[dict]):
+        doomed = {id(row) for row in rows}
+        self.tables[table] = [row for row in self.tables[table] if id(row) not in doomed]
+
+    # Projection and embedding
+    def _embedded(self, table: str, row: dict, target: str) -> Optional[dict]:
+        key = EMBED_KEYS.get((table, target)) or f"{target[:-1]}_id"
+        if key in row:
+            matches = [r for r in self.rows(target) if r.get("id") == row[key]]
+        else:
+            # Links are keyed by the (merchant_id, user_id) pair rather than a single FK
+            matches = [
+                r for r in self.rows(target)
+                if r.get("merchant_id") == row.get("merchant_id") and r.get("user_id") == row.get("user_id")
+            ]
+        return matches[0] if matches else None
+
+    def project(self, table: str, row: dict, select: str) -> dict:
+        result = {}
+        for item in _split_top_level(select):
+            if item == "*":
+                result.update(row)
+            elif "(" in item:
+                target, _, columns = item.partition("(")
+                embedded = self._embedded(table, row, target.strip())
+                result[target.strip()] = (
+                    self.project(target.strip(), embedded, columns[:-1]) if embedded else None
+                )
+            else:
+                result[item] = row.get(item)
+        return result
+
+    # Views (schemas/*.sql)
+    def _linked_merchants_view(self) -> List[dict]:
+        merchants = {m["id"]: m for m in self.tables["merchants"]}
+        return [
+            {
+                "link_id": link["id"],
+                "merchant_id": link["merchant_id"],
+                "user_id": link["user_id"],
+                "store_name": merchants.get(link["merchant_id"], {}).get("store_name") or "Unknown",
+                "balance": link.get("balance"),
+                "created_at": link.get("created_at"),
+            }
+            for link in self.tables["merchant_user_links"]
+        ]
+
+    # Functions (schemas/link_transaction_function.sql)
+    def _apply_link_transaction(self, params: dict) -> Optional[dict]:
+        links = [
+            link for link in self.tables["merchant_user_links"]
+            if link["merchant_id"] == params["p_merchant_id"] and link["user_id"] == params["p_user_id"]
+        ]
+        if not links:
+            return None
+
+        link = links[0]
+        amount = float(params["p_amount"])
+        current = float(link.get("balance") or 0)
+        if params["p_transaction_type"] == "debit" and not params.get("p_allow_overdraft", True) and current < amount:
+            return {"link_id": link["id"], "insufficient_funds": True, "balance": current}
+
+        balance = float(link.get("balance") or 0) + (amount if params["p_transaction_type"] == "credit" else -amount)
+        link["balance"] = balance
+
+        transaction = self.insert_rows("transactions", {
+            "merchant_id": params["p_merchant_id"],
+            "user_id": params["p_user_id"],
+            "amount": amount,
+            "transaction_type": params["p_transaction_type"],
+            "balance_after": balance,
+            **({"created_at": params["p_created_at"]} if params.get("p_created_at") else {}),
+        })[0]
+        users = [u for u in self.tables["users"] if u["id"] == params["p_user_id"]]
+
+        return {
+            "link_id": link["id"],
+            "balance_after": balance,
+            "transaction_id": transaction["id"],
+            "user_name": users[0].get("user_name") if users else None,
+        }
+
+    # Functions (schemas/test_fixtures.sql)
+    def _create_test_fixtures(self, params: dict) -> dict:
+        user = self.insert_rows("users", {
+            "id": params["p_user_id"],
+            "user_name": params["p_user_name"],
+            "user_passw": params["p_user_passw"],
+            "phone": params["p_user_phone"],
+            "pin": params["p_user_pin"],
+            "profile_completed": True,
+        })[0]
+        merchant = self.insert_rows("merchants", {
+            "id": params["p_merchant_id"],
+            "store_name": params["p_store_name"],
+            "phone": params["p_phone"],
+            "password": params["p_merchant_password"],
+        })[0]
+        return {"user": user, "merchant": merchant}
+
+    def _cleanup_test_pair(self, params: dict) -> None:
+        for table in ("reminders", "pay_requests", "transactions", "balance_requests", "link_requests", "merchant_user_links"):
+            self.tables[table] = [
+                row for row in self.tables[table]
+                if not (row.get("merchant_id") == params["p_merchant_id"] and row.get("user_id") == params["p_user_id"])
+            ]
+
+    def _cleanup_test_fixtures(self, params: dict) -> None:
+        self._cleanup_test_pair(params)
+        self.tables["merchants"] = [m for m in self.tables["merchants"] if m["id"] != params["p_merchant_id"]]
+        self.tables["users"] = [u for u in self.tables["users"] if u["id"] != params["p_user_id"]]
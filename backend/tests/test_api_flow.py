@@ -0,0 +1,81 @@
+"""
+End-to-end API flow: register merchant and user, link them, add balance, purchase
+(with the PIN, then with a PIN token from /link/authorize), delink.
+Runs in-process over httpx's ASGI transport, no live server needed.
+"""
+import random
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_merchant_user_flow(async_client, fake_pool, cleanup_queue):
+    """Walk the main wallet flow through the public endpoints"""
+    pin = "4321"
+
+    # Register merchant
+    response = await async_client.post("/merchant/register", json={
+        "store_name": fake_pool.next_company(),
+        "phone": f"8{random.randint(100000000, 999999999)}",
+        "password": fake_pool.next_password()
+    })
+    assert response.status_code == 201, response.text
+    merchant = response.json()
+    cleanup_queue["merchants"].append(merchant["merchant_id"])
+    headers = {"Authorization": f"Bearer {merchant['access_token']}"}
+
+    # Register user
+    response = await async_client.post("/user/register", json={
+        "user_name": fake_pool.next_user_name(),
+        "user_passw": fake_pool.next_password(),
+        "phone": f"7{random.randint(100000000, 999999999)}",
+        "pin": pin
+    })
+    assert response.status_code == 201, response.text
+    user = response.json()
+    cleanup_queue["users"].append(user["user_id"])
+
+    ids = {"merchant_id": merchant["merchant_id"], "user_id": user["user_id"]}
+
+    # Link them with the user's PIN
+    response = await async_client.post("/link/create", json={**ids, "pin": pin}, headers=headers)
+    assert response.status_code == 201, response.text
+    cleanup_queue["merchant_user_links"].append(response.json()["link_id"])
+
+    # Add balance
+    response = await async_client.post("/link/add-balance", json={**ids, "amount": 1000.0}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["new_balance"] == 1000.0
+
+    # Purchase
+    response = await async_client.post("/link/purchase", json={**ids, "amount": 250.0, "pin": pin}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["remaining_balance"] == 750.0
+    
+    # Authorize one purchase, then pay with the PIN token instead of the PIN
+    response = await async_client.post("/link/authorize", json={**ids, "amount": 50.0, "pin": pin}, headers=headers)
+    assert response.status_code == 200, response.text
+    pin_token = response.json()["pin_token"]
+    
+    # The token only covers the authorized amount
+    response = await async_client.post("/link/purchase", json={**ids, "amount": 500.0, "pin_token": pin_token}, headers=headers)
+    assert response.status_code == 401
+    
+    response = await async_client.post("/link/purchase", json={**ids, "amount": 50.0, "pin_token": pin_token}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["remaining_balance"] == 700.0
+    
+    # ... and only once
+    response = await async_client.post("/link/purchase", json={**ids, "amount": 50.0, "pin_token": pin_token}, headers=headers)
+    assert response.status_code == 401
+    assert "already used" in response.json()["detail"]
+    
+    # A PIN token is not an access token
+    response = await async_client.get(f"/link/balance/{ids['merchant_id']}/{ids['user_id']}",
+                                      headers={"Authorization": f"Bearer {pin_token}"})
+    assert response.status_code == 401
+    
+    # Delink; a second delink finds nothing
+    response = await async_client.post("/link/delink", json={**ids, "amount": 1.0, "pin": pin}, headers=headers)
+    assert response.status_code == 200, response.text
+    response = await async_client.post("/link/delink", json={**ids, "amount": 1.0, "pin": pin}, headers=headers)
+    assert response.status_code == 404
@@ -1,38 +1,40 @@
 """
 Tests for Merchant Routes
 """
+import httpx
 import pytest
-from faker import Faker
-
-fake = Faker()
+from main import app
+from middleware import auth_middleware
+from middleware.auth_middleware import LOGIN_MAX_FAILURES, LOGIN_ACCOUNT_MAX_FAILURES
 
 
 class TestMerchantRegistration:
     """Test merchant registration endpoint"""
     
-    def test_register_merchant_success(self, client):
+    def test_register_merchant_success(self, client, fake_pool, cleanup_queue):
         """Test successful merchant registration"""
         merchant_data = {
-            "store_name": fake.company(),
-            "phone": fake.phone_number()[:15],
-            "password": fake.password()
+            "store_name": fake_pool.next_company(),
+            "phone": fake_pool.next_phone()[:15],
+            "password": fake_pool.next_password()
         }
         
         response = client.post("/merchant/register", json=merchant_data)
         
         assert response.status_code == 201
         data = response.json()
+        cleanup_queue["merchants"].append(data["merchant_id"])
         assert "merchant_id" in data
         assert data["store_name"] == merchant_data["store_name"]
         assert "access_token" in data
         assert data["token_type"] == "bearer"
     
-    def test_register_merchant_duplicate_phone(self, client, test_merchant):
+    def test_register_merchant_duplicate_phone(self, client, test_merchant, fake_pool):
         """Test registration with duplicate phone number"""
         merchant_data = {
-            "store_name": fake.company(),
+            "store_name": fake_pool.next_company(),
             "phone": test_merchant["phone"],
-            "password": fake.password()
+            "password": fake_pool.next_password()
         }
         
         response = client.post("/merchant/register", json=merchant_data)
@@ -40,28 +42,17 @@ class TestMerchantRegistration:
         assert response.status_code == 400
         assert "already registered" in response.json()["detail"]
     
-    def test_register_merchant_missing_fields(self, client):
-        """Test registration with missing fields"""
-        merchant_data = {
-            "store_name": fake.company()
-            # Missing phone and password
-        }
-        
-        response = client.post("/merchant/register", json=merchant_data)
-        
-        assert response.status_code == 422  # Validation error
-    
-    def test_register_merchant_invalid_phone(self, client):
-        """Test registration with empty phone"""
-        merchant_data = {
-            "store_name": fake.company(),
-            "phone": "",
-            "password": fake.password()
-        }
-        
+    @pytest.mark.parametrize("merchant_data, expected_status", [
+        # Missing phone and password
+        ({"store_name": "Test Store"}, {422}),
+        # Empty phone
+        ({"store_name": "Test Store", "phone": "", "password": "password123"}, {400, 422}),
+    ], ids=["missing_fields", "invalid_phone"])
+    def test_register_merchant_invalid_input(self, client, merchant_data, expected_status):
+        """Test registration with missing or invalid fields"""
         response = client.post("/merchant/register", json=merchant_data)
         
-        assert response.status_code in [400, 422]
+        assert response.status_code in expected_status
 
 
 class TestMerchantLogin:
@@ -82,6 +73,59 @@ class TestMerchantLogin:
         assert data["merchant_id"] == test_merchant["merchant_id"]
         assert data["token_type"] == "bearer"
     
+    def test_login_merchant_locked_after_failures(self, client, test_merchant):
+        """Test repeated wrong passwords lock the account, even for the right password"""
+        wrong = {"phone": test_merchant["phone"], "password": "wrongpassword123"}
+        for _ in range(LOGIN_MAX_FAILURES):
+            assert client.post("/merchant/login", json=wrong).status_code == 401
+        
+        response = client.post("/merchant/login", json={
+            "phone": test_merchant["phone"],
+            "password": test_merchant["password"]
+        })
+        
+        assert response.status_code == 429
+    
+    @pytest.mark.asyncio
+    async def test_login_merchant_lockout_is_per_client(self, async_client, test_merchant):
+        """Test one client's failures don't lock the merchant out from another address"""
+        wrong = {"phone": test_merchant["phone"], "password": "wrongpassword123"}
+        right = {"phone": test_merchant["phone"], "password": test_merchant["password"]}
+        for _ in range(LOGIN_MAX_FAILURES):
+            assert (await async_client.post("/merchant/login", json=wrong)).status_code == 401
+        assert (await async_client.post("/merchant/login", json=right)).status_code == 429
+        
+        transport = httpx.ASGITransport(app=app, client=("10.0.0.2", 123))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as other_client:
+            response = await other_client.post("/merchant/login", json=right)
+        
+        assert response.status_code == 200
+    
+    @pytest.mark.asyncio
+    async def test_login_merchant_locked_across_clients(self, test_merchant):
+        """Test failures spread over many addresses still lock the merchant account"""
+        wrong = {"phone": test_merchant["phone"], "password": "wrongpassword123"}
+        right = {"phone": test_merchant["phone"], "password": test_merchant["password"]}
+        
+        async def login(address: str, data: dict) -> int:
+            transport = httpx.ASGITransport(app=app, client=(address, 123))
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as other_client:
+                return (await other_client.post("/merchant/login", json=data)).status_code
+        
+        for i in range(LOGIN_ACCOUNT_MAX_FAILURES):
+            assert await login(f"10.0.1.{i}", wrong) == 401
+        
+        assert await login("10.0.2.1", right) == 429
+    
+    def test_login_merchant_unknown_phone_not_counted(self, client):
+        """Test failed logins for phones with no account aren't tracked"""
+        for _ in range(LOGIN_MAX_FAILURES + 1):
+            response = client.post("/merchant/login", json={"phone": "9999999998", "password": "password123"})
+            assert response.status_code == 401
+        
+        assert len(auth_middleware._login_failures) == 0
+        assert len(auth_middleware._account_failures) == 0
+    
     def test_login_merchant_invalid_password(self, client, test_merchant):
         """Test login with invalid password"""
         login_data = {
@@ -94,23 +138,18 @@ class TestMerchantLogin:
         assert response.status_code == 401
         assert "Invalid credentials" in response.json()["detail"]
     
-    def test_login_merchant_nonexistent(self, client):
-        """Test login with non-existent merchant"""
-        login_data = {
-            "phone": "9999999999",
-            "password": "password123"
-        }
-        
+    @pytest.mark.parametrize("login_data, expected_status, expected_detail", [
+        # Unknown phones get the same answer as a wrong password, so accounts can't be enumerated
+        ({"phone": "9999999999", "password": "password123"}, 401, "Invalid credentials"),
+        ({}, 422, None),  # Validation error
+    ], ids=["nonexistent", "missing_credentials"])
+    def test_login_merchant_rejected(self, client, login_data, expected_status, expected_detail):
+        """Test login with a non-existent merchant or missing credentials"""
         response = client.post("/merchant/login", json=login_data)
         
-        assert response.status_code == 401
-        assert "Merchant not found" in response.json()["detail"]
-    
-    def test_login_merchant_missing_credentials(self, client):
-        """Test login with missing credentials"""
-        response = client.post("/merchant/login", json={})
-        
-        assert response.status_code == 422  # Validation error
+        assert response.status_code == expected_status
+        if expected_detail:
+            assert expected_detail in response.json()["detail"]
 
 
 class TestMerchantProfile:
@@ -124,8 +163,11 @@ class TestMerchantProfile:
         
         assert response.status_code == 200
         data = response.json()
-        assert data["merchant_id"] == test_merchant["merchant_id"]
+        assert data["id"] == test_merchant["merchant_id"]
         assert data["store_name"] == test_merchant["store_name"]
+        assert data["phone"] == test_merchant["phone"]
+        assert data["has_password"] is True
+        assert "password" not in data
     
     def test_get_merchant_profile_unauthorized(self, client, test_merchant):
         """Test getting profile without token"""
@@ -161,12 +203,12 @@ class TestLinkedUsers:
         
         assert response.status_code == 401
     
-    def test_get_linked_users_empty(self, client, merchant_token):
+    def test_get_linked_users_empty(self, client, merchant_token, fake_pool):
         """Test getting linked users when none exist"""
         # Create a new merchant without links
         merchant_data = {
-            "store_name": fake.company(),
-            "phone": fake.phone_number()[:15],
+            "store_name": fake_pool.next_company(),
+            "phone": fake_pool.next_phone()[:15],
             "password": "password123"
         }
         reg_response = client.post("/merchant/register", json=merchant_data)
@@ -3,23 +3,28 @@ Tests for OAuth Routes
 Note: These tests require mocking Google OAuth verification
 """
 import pytest
-from unittest.mock import patch, MagicMock
-from faker import Faker
+from unittest.mock import MagicMock
+from routes import oauth_routes
 
-fake = Faker()
+
+@pytest.fixture
+def google_mock(monkeypatch):
+    """Replace Google token verification with a mock the test configures"""
+    mock = MagicMock()
+    monkeypatch.setattr(oauth_routes.id_token, "verify_oauth2_token", mock)
+    return mock
 
 
 class TestGoogleOAuth:
     """Test Google OAuth login/registration endpoint"""
     
-    @patch('oauth_routes.id_token.verify_oauth2_token')
-    def test_oauth_register_user_success(self, mock_verify, client):
+    def test_oauth_register_user_success(self, google_mock, client, fake_pool, cleanup_queue):
         """Test successful user registration via OAuth"""
         # Mock Google token verification
-        mock_verify.return_value = {
-            'email': fake.email(),
-            'name': fake.name(),
-            'sub': fake.uuid4()
+        google_mock.return_value = {
+            'email': fake_pool.next_email(),
+            'name': fake_pool.next_name(),
+            'sub': fake_pool.next_uuid()
         }
         
         oauth_data = {
@@ -31,18 +36,18 @@ class TestGoogleOAuth:
         
         assert response.status_code == 200
         data = response.json()
+        cleanup_queue["users"].append(data["user_id"])
         assert "user_id" in data
         assert "access_token" in data
         assert data["profile_completed"] == False
     
-    @patch('oauth_routes.id_token.verify_oauth2_token')
-    def test_oauth_register_merchant_success(self, mock_verify, client):
+    def test_oauth_register_merchant_success(self, google_mock, client, fake_pool, cleanup_queue):
         """Test successful merchant registration via OAuth"""
         # Mock Google token verification
-        mock_verify.return_value = {
-            'email': fake.email(),
-            'name': fake.name(),
-            'sub': fake.uuid4()
+        google_mock.return_value = {
+            'email': fake_pool.next_email(),
+            'name': fake_pool.next_name(),
+            'sub': fake_pool.next_uuid()
         }
         
         oauth_data = {
@@ -54,15 +59,15 @@ class TestGoogleOAuth:
         
         assert response.status_code == 200
         data = response.json()
+        cleanup_queue["merchants"].append(data["merchant_id"])
         assert "merchant_id" in data
         assert "access_token" in data
         assert data["profile_completed"] == False
     
-    @patch('oauth_routes.id_token.verify_oauth2_token')
-    def test_oauth_login_existing_user(self, mock_verify, client, test_user, supabase):
+    def test_oauth_login_existing_user(self, google_mock, client, test_user, supabase, fake_pool):
         """Test OAuth login for existing user"""
-        google_id = fake.uuid4()
-        google_email = fake.email()
+        google_id = fake_pool.next_uuid()
+        google_email = fake_pool.next_email()
         
         # Update test user with Google credentials
         supabase.table("users").update({
@@ -71,7 +76,7 @@ class TestGoogleOAuth:
         }).eq("id", test_user["user_id"]).execute()
         
         # Mock Google token verification
-        mock_verify.return_value = {
+        google_mock.return_value = {
             'email': google_email,
             'name': test_user["user_name"],
             'sub': google_id
@@ -89,11 +94,10 @@ class TestGoogleOAuth:
         assert data["user_id"] == test_user["user_id"]
         assert "access_token" in data
     
-    @patch('oauth_routes.id_token.verify_oauth2_token')
-    def test_oauth_invalid_token(self, mock_verify, client):
+    def test_oauth_invalid_token(self, google_mock, client):
         """Test OAuth with invalid token"""
         # Mock token verification failure
-        mock_verify.side_effect = ValueError("Invalid token")
+        google_mock.side_effect = ValueError("Invalid token")
         
         oauth_data = {
             "id_token": "invalid_token",
@@ -121,33 +125,18 @@ class TestGoogleOAuth:
 class TestCompleteMerchantProfile:
     """Test complete merchant OAuth profile endpoint"""
     
-    @patch('oauth_routes.id_token.verify_oauth2_token')
-    def test_complete_merchant_profile_success(self, mock_verify, client):
+    def test_complete_merchant_profile_success(self, client, oauth_merchant_session, fake_pool):
         """Test successful merchant profile completion"""
-        # Create OAuth merchant first
-        mock_verify.return_value = {
-            'email': fake.email(),
-            'name': fake.name(),
-            'sub': fake.uuid4()
-        }
-        
-        oauth_data = {
-            "id_token": "mock_token",
-            "user_type": "merchant"
-        }
-        
-        oauth_response = client.post("/oauth/google", json=oauth_data)
-        merchant_id = oauth_response.json()["merchant_id"]
-        token = oauth_response.json()["access_token"]
+        merchant_id, token = oauth_merchant_session
         
         # Complete profile
         headers = {"Authorization": f"Bearer {token}"}
         profile_data = {
             "merchant_id": merchant_id,
-            "store_name": fake.company(),
-            "owner_name": fake.name(),
-            "phone": fake.phone_number()[:15],
-            "store_address": fake.address()[:100]
+            "store_name": fake_pool.next_company(),
+            "owner_name": fake_pool.next_name(),
+            "phone": fake_pool.next_phone()[:15],
+            "store_address": fake_pool.next_address()[:100]
         }
         
         response = client.post("/oauth/merchant/complete-profile", json=profile_data, headers=headers)
@@ -157,40 +146,28 @@ class TestCompleteMerchantProfile:
         assert data["profile_completed"] == True
         assert data["store_name"] == profile_data["store_name"]
     
-    def test_complete_merchant_profile_unauthorized(self, client):
+    def test_complete_merchant_profile_unauthorized(self, client, fake_pool):
         """Test completing profile without token"""
         profile_data = {
             "merchant_id": "MER123456789",
-            "store_name": fake.company(),
-            "owner_name": fake.name()
+            "store_name": fake_pool.next_company(),
+            "owner_name": fake_pool.next_name()
         }
         
         response = client.post("/oauth/merchant/complete-profile", json=profile_data)
         
         assert response.status_code == 401
     
-    @patch('oauth_routes.id_token.verify_oauth2_token')
-    def test_complete_merchant_profile_wrong_merchant(self, mock_verify, client):
+    def test_complete_merchant_profile_wrong_merchant(self, client, oauth_merchant_session, fake_pool):
         """Test completing another merchant's profile"""
-        # Create OAuth merchant
-        mock_verify.return_value = {
-            'email': fake.email(),
-            'name': fake.name(),
-            'sub': fake.uuid4()
-        }
-        
-        oauth_response = client.post("/oauth/google", json={
-            "id_token": "mock_token",
-            "user_type": "merchant"
-        })
-        token = oauth_response.json()["access_token"]
+        _, token = oauth_merchant_session
         
         # Try to complete different merchant's profile
         headers = {"Authorization": f"Bearer {token}"}
         profile_data = {
             "merchant_id": "MER999999999",
-            "store_name": fake.company(),
-            "owner_name": fake.name()
+            "store_name": fake_pool.next_company(),
+            "owner_name": fake_pool.next_name()
         }
         
         response = client.post("/oauth/merchant/complete-profile", json=profile_data, headers=headers)
@@ -201,31 +178,17 @@ class TestCompleteMerchantProfile:
 class TestCompleteUserProfile:
     """Test complete user OAuth profile endpoint"""
     
-    @patch('oauth_routes.id_token.verify_oauth2_token')
-    def test_complete_user_profile_success(self, mock_verify, client):
+    def test_complete_user_profile_success(self, client, oauth_user_session, fake_pool):
         """Test successful user profile completion"""
-        # Create OAuth user first
-        mock_verify.return_value = {
-            'email': fake.email(),
-            'name': fake.name(),
-            'sub': fake.uuid4()
-        }
-        
-        oauth_data = {
-            "id_token": "mock_token",
-            "user_type": "user"
-        }
-        
-        oauth_response = client.post("/oauth/google", json=oauth_data)
-        user_id = oauth_response.json()["user_id"]
-        token = oauth_response.json()["access_token"]
+        user_id, token = oauth_user_session
         
         # Complete profile
         headers = {"Authorization": f"Bearer {token}"}
         profile_data = {
             "user_id": user_id,
-            "user_name": fake.user_name(),
-            "phone": fake.phone_number()[:15]
+            "user_name": fake_pool.next_user_name(),
+            "phone": fake_pool.next_phone()[:15],
+            "pin": "1234"
         }
         
         response = client.post("/oauth/user/complete-profile", json=profile_data, headers=headers)
@@ -235,37 +198,25 @@ class TestCompleteUserProfile:
         assert data["profile_completed"] == True
         assert data["user_name"] == profile_data["user_name"]
     
-    def test_complete_user_profile_unauthorized(self, client):
+    def test_complete_user_profile_unauthorized(self, client, fake_pool):
         """Test completing profile without token"""
         profile_data = {
             "user_id": "USR123456789",
-            "user_name": fake.user_name()
+            "user_name": fake_pool.next_user_name()
         }
         
         response = client.post("/oauth/user/complete-profile", json=profile_data)
         
         assert response.status_code == 401
     
-    @patch('oauth_routes.id_token.verify_oauth2_token')
-    def test_complete_user_profile_missing_fields(self, mock_verify, client):
+    def test_complete_user_profile_missing_fields(self, client, oauth_user_session):
         """Test completing profile with missing fields"""
-        # Create OAuth user
-        mock_verify.return_value = {
-            'email': fake.email(),
-            'name': fake.name(),
-            'sub': fake.uuid4()
-        }
-        
-        oauth_response = client.post("/oauth/google", json={
-            "id_token": "mock_token",
-            "user_type": "user"
-        })
-        token = oauth_response.json()["access_token"]
+        user_id, token = oauth_user_session
         
         # Try to complete with missing fields
         headers = {"Authorization": f"Bearer {token}"}
         profile_data = {
-            "user_id": oauth_response.json()["user_id"]
+            "user_id": user_id
             # Missing user_name
         }
         
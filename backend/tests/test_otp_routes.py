@@ -0,0 +1,129 @@
+"""
+Tests for OTP Routes
+"""
+import httpx
+import pytest
+from datetime import datetime, timedelta
+from tenacity import wait_none
+from routes import otp_routes
+from routes.otp_routes import otp_storage, OTP_MAX_ATTEMPTS
+
+
+@pytest.fixture
+def stored_otp(fake_pool):
+    """An unexpired OTP stored for a phone, skipping the SMS send"""
+    phone = fake_pool.next_phone()
+    otp_storage[phone] = {
+        "otp": "123456",
+        "expiry": datetime.now() + timedelta(minutes=5),
+        "attempts": 0
+    }
+    yield {"phone": phone, "otp": "123456"}
+    otp_storage.pop(phone, None)
+
+
+@pytest.fixture
+def sms_provider(client, monkeypatch):
+    """
+    Replace SMSINDIAHUB with a mock transport that fails the first `failures`
+    calls with a connection error, and skip the retry backoff.
+    Yields the list of requests the mock received.
+    """
+    calls = []
+    state = {"failures": 0}
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) <= state["failures"]:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, json={"ErrorCode": "000", "ErrorMessage": "Done"})
+    
+    monkeypatch.setattr(otp_routes, "_http", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(otp_routes._post_sms.retry, "wait", wait_none())
+    otp_routes._sms_breaker.close()
+    
+    yield calls, state
+    
+    otp_routes._sms_breaker.close()
+
+
+class TestSendOTP:
+    """Test send OTP endpoint against a mocked SMS provider"""
+    
+    def test_send_otp_retries_transient_error(self, client, sms_provider, fake_pool):
+        """Test a connection error is retried and the OTP is still sent"""
+        calls, state = sms_provider
+        state["failures"] = 1
+        phone = fake_pool.next_phone()
+        
+        response = client.post("/otp/send", json={"phone": phone})
+        
+        assert response.status_code == 200
+        assert len(calls) == 2
+        assert phone in otp_storage
+        otp_storage.pop(phone, None)
+    
+    def test_send_otp_retries_count_as_one_breaker_failure(self, client, sms_provider, fake_pool):
+        """Test a send that fails every retry adds a single failure to the breaker"""
+        calls, state = sms_provider
+        state["failures"] = 100
+        
+        response = client.post("/otp/send", json={"phone": fake_pool.next_phone()})
+        
+        assert response.status_code == 500
+        assert len(calls) == 3
+        assert otp_routes._sms_breaker.fail_counter == 1
+    
+    def test_send_otp_breaker_opens_after_failures(self, client, sms_provider, fake_pool):
+        """Test the breaker opens after fail_max failed sends and then answers 503 without calling out"""
+        calls, state = sms_provider
+        state["failures"] = 100
+        fail_max = otp_routes._sms_breaker.fail_max
+        
+        for _ in range(fail_max - 1):
+            response = client.post("/otp/send", json={"phone": fake_pool.next_phone()})
+            assert response.status_code == 500
+        
+        # The send that reaches fail_max trips the breaker
+        response = client.post("/otp/send", json={"phone": fake_pool.next_phone()})
+        assert response.status_code == 503
+        
+        sent = len(calls)
+        response = client.post("/otp/send", json={"phone": fake_pool.next_phone()})
+        
+        assert response.status_code == 503
+        assert len(calls) == sent
+
+
+class TestVerifyOTP:
+    """Test verify OTP endpoint"""
+    
+    def test_verify_otp_success(self, client, stored_otp):
+        """Test verifying the stored OTP"""
+        response = client.post("/otp/verify", json=stored_otp)
+        
+        assert response.status_code == 200
+        assert response.json()["verified"] is True
+        assert stored_otp["phone"] not in otp_storage
+    
+    def test_verify_otp_locked_after_max_attempts(self, client, stored_otp):
+        """Test each wrong OTP counts down, and the attempt after the last is refused"""
+        wrong = {"phone": stored_otp["phone"], "otp": "000000"}
+        for remaining in range(OTP_MAX_ATTEMPTS - 1, -1, -1):
+            response = client.post("/otp/verify", json=wrong)
+            assert response.status_code == 400
+            assert f"{remaining} attempts remaining" in response.json()["detail"]
+        
+        # Even the right OTP is refused once the attempts are used up
+        response = client.post("/otp/verify", json=stored_otp)
+        
+        assert response.status_code == 400
+        assert "Too many failed attempts" in response.json()["detail"]
+        assert stored_otp["phone"] not in otp_storage
+    
+    def test_verify_otp_not_found(self, client):
+        """Test verifying a phone with no OTP"""
+        response = client.post("/otp/verify", json={"phone": "9000000000", "otp": "123456"})
+        
+        assert response.status_code == 400
+        assert "No OTP found" in response.json()["detail"]
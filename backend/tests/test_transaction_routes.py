@@ -2,9 +2,6 @@
 Tests for Transaction Routes
 """
 import pytest
-from faker import Faker
-
-fake = Faker()
 
 
 class TestCreateLink:
@@ -27,58 +24,28 @@ class TestCreateLink:
         assert data["merchant_id"] == test_merchant["merchant_id"]
         assert data["user_id"] == test_user["user_id"]
     
-    def test_create_link_invalid_pin(self, client, test_merchant, test_user, merchant_token):
-        """Test link creation with invalid PIN"""
-        headers = {"Authorization": f"Bearer {merchant_token}"}
-        link_data = {
-            "merchant_id": test_merchant["merchant_id"],
-            "user_id": test_user["user_id"],
-            "pin": "123"  # Too short
-        }
-        
-        response = client.post("/link/create", json=link_data, headers=headers)
-        
-        assert response.status_code == 400
-        assert "PIN must be 4 digits" in response.json()["detail"]
-    
-    def test_create_link_duplicate(self, client, test_merchant, test_user, merchant_token, test_link):
-        """Test creating duplicate link"""
-        headers = {"Authorization": f"Bearer {merchant_token}"}
+    @pytest.mark.parametrize("overrides, with_token, expected_status, expected_detail", [
+        ({"pin": "123"}, True, 422, None),  # Too short, rejected by the model
+        ({}, True, 400, "already exists"),
+        ({"merchant_id": "MER999999999"}, True, 404, "Merchant not found"),
+        ({}, False, 401, None),
+    ], ids=["invalid_pin", "duplicate", "merchant_not_found", "unauthorized"])
+    def test_create_link_rejected(self, client, test_merchant, test_user, merchant_token, test_link,
+                                  overrides, with_token, expected_status, expected_detail):
+        """Test link creation with a bad PIN, an existing link, an unknown merchant or no token"""
+        headers = {"Authorization": f"Bearer {merchant_token}"} if with_token else {}
         link_data = {
             "merchant_id": test_merchant["merchant_id"],
             "user_id": test_user["user_id"],
-            "pin": "1234"
-        }
-        
-        response = client.post("/link/create", json=link_data, headers=headers)
-        
-        assert response.status_code == 409
-        assert "already exists" in response.json()["detail"]
-    
-    def test_create_link_merchant_not_found(self, client, test_user, merchant_token):
-        """Test link creation with non-existent merchant"""
-        headers = {"Authorization": f"Bearer {merchant_token}"}
-        link_data = {
-            "merchant_id": "MER999999999",
-            "user_id": test_user["user_id"],
-            "pin": "1234"
+            "pin": "1234",
+            **overrides
         }
         
         response = client.post("/link/create", json=link_data, headers=headers)
         
-        assert response.status_code in [403, 404]
-    
-    def test_create_link_unauthorized(self, client, test_merchant, test_user):
-        """Test link creation without token"""
-        link_data = {
-            "merchant_id": test_merchant["merchant_id"],
-            "user_id": test_user["user_id"],
-            "pin": "1234"
-        }
-        
-        response = client.post("/link/create", json=link_data)
-        
-        assert response.status_code == 401
+        assert response.status_code == expected_status
+        if expected_detail:
+            assert expected_detail in response.json()["detail"]
 
 
 class TestAddBalance:
@@ -99,22 +66,21 @@ class TestAddBalance:
         assert response.status_code == 200
         data = response.json()
         assert "Balance added successfully" in data["message"]
-        assert data["new_balance"] == 500.00
+        assert data["new_balance"] == test_link["balance"] + 500.00
     
-    def test_add_balance_invalid_pin(self, client, test_link, merchant_token):
-        """Test balance addition with wrong PIN"""
+    def test_add_balance_no_link(self, client, test_merchant, unlinked_user, merchant_token):
+        """Test balance addition for a user the merchant isn't linked to"""
         headers = {"Authorization": f"Bearer {merchant_token}"}
         balance_data = {
-            "merchant_id": test_link["merchant_id"],
-            "user_id": test_link["user_id"],
-            "amount": 500.00,
-            "pin": "9999"
+            "merchant_id": test_merchant["merchant_id"],
+            "user_id": unlinked_user["user_id"],
+            "amount": 500.00
         }
         
         response = client.post("/link/add-balance", json=balance_data, headers=headers)
         
-        assert response.status_code == 401
-        assert "Invalid PIN" in response.json()["detail"]
+        assert response.status_code == 404
+        assert "No link found" in response.json()["detail"]
     
     def test_add_balance_negative_amount(self, client, test_link, merchant_token):
         """Test balance addition with negative amount"""
@@ -128,8 +94,7 @@ class TestAddBalance:
         
         response = client.post("/link/add-balance", json=balance_data, headers=headers)
         
-        assert response.status_code == 400
-        assert "Amount must be greater than 0" in response.json()["detail"]
+        assert response.status_code == 422  # Validation error
     
     def test_add_balance_exceeds_limit(self, client, test_link, merchant_token):
         """Test balance addition exceeding maximum limit"""
@@ -148,6 +113,7 @@ class TestAddBalance:
         assert response.status_code in [200, 400]
 
 
+@pytest.mark.slow
 class TestProcessPurchase:
     """Test process purchase endpoint"""
     
@@ -215,7 +181,7 @@ class TestProcessPurchase:
         
         response = client.post("/link/purchase", json=purchase_data, headers=headers)
         
-        assert response.status_code == 400
+        assert response.status_code == 422  # Validation error
 
 
 class TestGetBalance:
@@ -234,7 +200,25 @@ class TestGetBalance:
         data = response.json()
         assert "balance" in data
         assert isinstance(data["balance"], (int, float))
-    
+
+    def test_get_balance_after_add_balance(self, client, test_link, merchant_token):
+        """Test cached balance is refreshed after a credit"""
+        headers = {"Authorization": f"Bearer {merchant_token}"}
+        url = f"/link/balance/{test_link['merchant_id']}/{test_link['user_id']}"
+
+        before = client.get(url, headers=headers).json()["balance"]
+
+        response = client.post("/link/add-balance", json={
+            "merchant_id": test_link["merchant_id"],
+            "user_id": test_link["user_id"],
+            "amount": 100.00
+        }, headers=headers)
+        assert response.status_code == 200
+
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["balance"] == before + 100.00
+
     def test_get_balance_unauthorized(self, client, test_link):
         """Test getting balance without token"""
         response = client.get(
@@ -2,44 +2,46 @@
 Tests for User Routes
 """
 import pytest
-from faker import Faker
-
-fake = Faker()
+from core.cache import get_cached
+from routes.user_routes import NOTIFICATIONS_MAX_LIMIT
 
 
 class TestUserRegistration:
     """Test user registration endpoint"""
     
-    def test_register_user_success(self, client):
+    def test_register_user_success(self, client, fake_pool, cleanup_queue):
         """Test successful user registration"""
         user_data = {
-            "user_name": fake.user_name(),
-            "user_passw": fake.password()
+            "user_name": fake_pool.next_user_name(),
+            "user_passw": fake_pool.next_password(),
+            "phone": fake_pool.next_phone(),
+            "pin": "1234"
         }
         
         response = client.post("/user/register", json=user_data)
         
         assert response.status_code == 201
         data = response.json()
+        cleanup_queue["users"].append(data["user_id"])
         assert "user_id" in data
         assert data["user_name"] == user_data["user_name"]
         assert "access_token" in data
         assert data["token_type"] == "bearer"
     
-    def test_register_user_missing_name(self, client):
+    def test_register_user_missing_name(self, client, fake_pool):
         """Test registration with missing user_name"""
         user_data = {
-            "user_passw": fake.password()
+            "user_passw": fake_pool.next_password()
         }
         
         response = client.post("/user/register", json=user_data)
         
         assert response.status_code == 422  # Validation error
     
-    def test_register_user_missing_password(self, client):
+    def test_register_user_missing_password(self, client, fake_pool):
         """Test registration with missing password"""
         user_data = {
-            "user_name": fake.user_name()
+            "user_name": fake_pool.next_user_name()
         }
         
         response = client.post("/user/register", json=user_data)
@@ -50,50 +52,26 @@ class TestUserRegistration:
 class TestUserLogin:
     """Test user login endpoint"""
     
-    def test_login_user_success(self, client, test_user):
-        """Test successful user login"""
-        login_data = {
-            "user_id": test_user["user_id"],
-            "user_passw": test_user["password"]
-        }
-        
-        response = client.post("/user/login", json=login_data)
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert "access_token" in data
-        assert data["user_id"] == test_user["user_id"]
-        assert data["token_type"] == "bearer"
-    
-    def test_login_user_invalid_password(self, client, test_user):
-        """Test login with invalid password"""
-        login_data = {
-            "user_id": test_user["user_id"],
-            "user_passw": "wrongpassword123"
-        }
-        
-        response = client.post("/user/login", json=login_data)
-        
-        assert response.status_code == 401
-        assert "Invalid credentials" in response.json()["detail"]
-    
-    def test_login_user_nonexistent(self, client):
-        """Test login with non-existent user"""
-        login_data = {
-            "user_id": "USR999999999",
-            "user_passw": "password123"
-        }
-        
-        response = client.post("/user/login", json=login_data)
-        
-        assert response.status_code == 401
-        assert "User not found" in response.json()["detail"]
-    
-    def test_login_user_missing_credentials(self, client):
-        """Test login with missing credentials"""
-        response = client.post("/user/login", json={})
-        
-        assert response.status_code == 422  # Validation error
+    @pytest.mark.parametrize("make_login_data, expected_status, expected_detail", [
+        (lambda user: {"phone": user["phone"], "user_passw": user["password"]}, 200, None),
+        (lambda user: {"phone": user["phone"], "user_passw": "wrongpassword123"}, 401, "Invalid credentials"),
+        # Unknown phones get the same answer as a wrong password, so accounts can't be enumerated
+        (lambda user: {"phone": "7000000000", "user_passw": "password123"}, 401, "Invalid credentials"),
+        (lambda user: {}, 422, None),  # Validation error
+    ], ids=["success", "invalid_password", "nonexistent", "missing_credentials"])
+    def test_login_user(self, client, test_user, make_login_data, expected_status, expected_detail):
+        """Test user login with valid, wrong, unknown and missing credentials"""
+        response = client.post("/user/login", json=make_login_data(test_user))
+        
+        assert response.status_code == expected_status
+        if expected_status == 200:
+            data = response.json()
+            assert "access_token" in data
+            assert data["user_id"] == test_user["user_id"]
+            assert data["user_name"] == test_user["user_name"]
+            assert data["token_type"] == "bearer"
+        elif expected_detail:
+            assert expected_detail in response.json()["detail"]
 
 
 class TestUserProfile:
@@ -107,8 +85,10 @@ class TestUserProfile:
         
         assert response.status_code == 200
         data = response.json()
-        assert data["user_id"] == test_user["user_id"]
+        assert data["id"] == test_user["user_id"]
         assert data["user_name"] == test_user["user_name"]
+        assert data["has_password"] is True
+        assert "user_passw" not in data
     
     def test_get_user_profile_unauthorized(self, client, test_user):
         """Test getting profile without token"""
@@ -144,21 +124,97 @@ class TestLinkedMerchants:
         
         assert response.status_code == 401
     
-    def test_get_linked_merchants_empty(self, client, test_user, user_token):
+    def test_get_linked_merchants_empty(self, client, unlinked_user):
         """Test getting linked merchants when none exist"""
-        headers = {"Authorization": f"Bearer {user_token}"}
+        headers = {"Authorization": f"Bearer {unlinked_user['token']}"}
+        response = client.get(f"/user/linked-merchants/{unlinked_user['user_id']}", headers=headers)
         
-        # Create a new user without links
-        new_user_data = {
-            "user_name": fake.user_name(),
-            "user_passw": "password123"
-        }
-        reg_response = client.post("/user/register", json=new_user_data)
-        new_user_id = reg_response.json()["user_id"]
-        new_token = reg_response.json()["access_token"]
+        assert response.status_code == 200
+        assert response.json() == []
+
+
+class TestDeleteAccount:
+    """Test delete user account endpoint"""
+    
+    def test_delete_account_clears_cached_reads(self, client, fake_pool):
+        """Test deleting an account drops the user's cached linked merchants"""
+        response = client.post("/user/register", json={
+            "user_name": fake_pool.next_user_name(),
+            "user_passw": fake_pool.next_password(),
+            "phone": fake_pool.next_phone(),
+            "pin": "1234"
+        })
+        assert response.status_code == 201
+        user_id = response.json()["user_id"]
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
         
-        headers = {"Authorization": f"Bearer {new_token}"}
-        response = client.get(f"/user/linked-merchants/{new_user_id}", headers=headers)
+        assert client.get(f"/user/linked-merchants/{user_id}", headers=headers).json() == []
+        assert get_cached(("user", user_id), ("linked_merchants",)) == []
+        
+        response = client.delete(f"/user/account/{user_id}", headers=headers)
         
         assert response.status_code == 200
-        assert response.json() == []
+        assert get_cached(("user", user_id), ("linked_merchants",)) is None
+
+
+class TestNotifications:
+    """Test user notifications endpoint"""
+    
+    @pytest.fixture
+    def reminders(self, supabase, test_link):
+        """Active reminders on test_link, several sharing a reminder_date, oldest first"""
+        rows = [
+            {
+                "merchant_id": test_link["merchant_id"],
+                "user_id": test_link["user_id"],
+                "link_id": test_link["link_id"],
+                "message": f"Reminder {i}",
+                # Three reminders per day, with the +05:30 offset the app stores
+                "reminder_date": f"2026-01-{1 + i // 3:02d}T10:00:00+05:30",
+                "status": "active"
+            }
+            for i in range(NOTIFICATIONS_MAX_LIMIT + 1)
+        ]
+        # Removed by reset_test_pair after the test
+        result = supabase.table("reminders").insert(rows).execute()
+        return [row["id"] for row in result.data]
+    
+    def test_get_notifications_unpaginated(self, client, test_user, user_token, reminders):
+        """Test every active reminder is returned when no limit is given"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        
+        response = client.get(f"/user/notifications/{test_user['user_id']}", headers=headers)
+        
+        assert response.status_code == 200
+        assert [n["id"] for n in response.json()] == reminders
+        assert "X-Next-Cursor" not in response.headers
+    
+    def test_get_notifications_paginated(self, client, test_user, user_token, reminders):
+        """Test walking the pages with X-Next-Cursor visits each reminder once, in order"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        url = f"/user/notifications/{test_user['user_id']}"
+        
+        seen, params = [], {"limit": 2}
+        while True:
+            response = client.get(url, params=params, headers=headers)
+            assert response.status_code == 200
+            seen += [n["id"] for n in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            params = {"limit": 2, "after": cursor}
+        
+        assert seen == reminders
+    
+    def test_get_notifications_invalid_cursor(self, client, test_user, user_token):
+        """Test a cursor the API didn't issue is rejected"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        
+        response = client.get(
+            f"/user/notifications/{test_user['user_id']}",
+            params={"limit": 2, "after": "2026-01-01T10:00:00+05:30|1"},
+            headers=headers
+        )
+        
+        assert response.status_code == 400
+        assert "Invalid cursor" in response.json()["detail"]